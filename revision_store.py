@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Локальное хранилище текстов ревизий и их пакетная загрузка из API, общие для
+wp-maintenance-template-add-dates.py и wp-maintenance-template-date-adjuster.py
+(оба скрипта могут работать с одним файлом).
+"""
+import sqlite3
+import threading
+import zlib
+from typing import Dict, List, Optional
+
+import pywikibot
+from pywikibot.data import api
+
+# Ограничение SQLite на количество параметров запроса
+SQLITE_MAX_PARAMETERS = 500
+
+# Максимальное количество ревизий с текстом в одном запросе к API
+REVISION_TEXT_BATCH_SIZE = 50
+
+
+class RevisionStore:
+    """
+    Локальное хранилище текстов ревизий (SQLite, тексты сжаты zlib).
+    Сохранённая ревизия больше никогда не меняется, поэтому текст, однажды загруженный
+    по revid, при следующих запусках читается с диска, а не из API.
+    Хранилищем пользуются и потоки предзагрузки, поэтому обращения к базе защищены блокировкой.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS revision_texts (revid INTEGER PRIMARY KEY, text BLOB NOT NULL)"
+        )
+        self.connection.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, revids: List[int]) -> Dict[int, str]:
+        """Возвращает тексты ревизий, которые уже есть в хранилище"""
+        texts = {}
+        with self.lock:
+            for i in range(0, len(revids), SQLITE_MAX_PARAMETERS):
+                batch = revids[i:i + SQLITE_MAX_PARAMETERS]
+                placeholders = ','.join('?' * len(batch))
+                rows = self.connection.execute(
+                    f"SELECT revid, text FROM revision_texts WHERE revid IN ({placeholders})", batch
+                ).fetchall()
+                for revid, blob in rows:
+                    texts[revid] = zlib.decompress(blob).decode('utf-8')
+            self.hits += len(texts)
+            self.misses += len(revids) - len(texts)
+        return texts
+
+    def put_many(self, texts: Dict[int, Optional[str]]) -> None:
+        """Сохраняет тексты ревизий (скрытые ревизии без текста не сохраняются)"""
+        rows = [(revid, zlib.compress(text.encode('utf-8')))
+                for revid, text in texts.items() if text is not None]
+        if rows:
+            with self.lock:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO revision_texts (revid, text) VALUES (?, ?)", rows
+                )
+                self.connection.commit()
+
+    def clear(self) -> None:
+        """Удаляет все сохранённые тексты (используется для временного хранилища режима 'dump')"""
+        with self.lock:
+            self.connection.execute("DELETE FROM revision_texts")
+            self.connection.commit()
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+
+def fetch_revision_texts(site: pywikibot.Site, revids: List[int],
+                         store: Optional[RevisionStore] = None) -> Dict[int, Optional[str]]:
+    """
+    Возвращает тексты ревизий по их идентификаторам.
+    Сначала тексты ищутся в хранилище store, остальные загружаются из API
+    по REVISION_TEXT_BATCH_SIZE ревизий за запрос и сохраняются в хранилище.
+    Для скрытых ревизий текст равен None.
+    """
+    texts: Dict[int, Optional[str]] = {}
+    if store is not None and revids:
+        texts.update(store.get_many(revids))
+    missing = [revid for revid in revids if revid not in texts]
+
+    for i in range(0, len(missing), REVISION_TEXT_BATCH_SIZE):
+        batch = missing[i:i + REVISION_TEXT_BATCH_SIZE]
+        parameters = {
+            'action': 'query',
+            'prop': 'revisions',
+            'revids': '|'.join(str(revid) for revid in batch),
+            'rvprop': 'ids|content',
+            'rvslots': 'main',
+            'formatversion': 2,
+        }
+        data = api.Request(site=site, parameters=parameters).submit()
+        fetched: Dict[int, Optional[str]] = {}
+        for page_data in data.get('query', {}).get('pages', []):
+            for rev in page_data.get('revisions', []):
+                fetched[rev['revid']] = rev.get('slots', {}).get('main', {}).get('content')
+        for revid in batch:
+            fetched.setdefault(revid, None)
+        if store is not None:
+            store.put_many(fetched)
+        texts.update(fetched)
+    return texts
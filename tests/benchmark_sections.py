@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Замер однопроходного find_sections против прежнего просмотра строк для каждого уровня заголовка
+на статьях-списках (заголовки по годам со списками и подразделами).
+
+Запуск: python tests/benchmark_sections.py
+"""
+import os
+import timeit
+
+os.environ.setdefault('PYWIKIBOT_NO_USER_CONFIG', '1')
+
+from conftest import load_script
+from legacy_sections import find_sections_per_heading
+
+
+def make_list_article(heading_count: int) -> str:
+    """Статья-список: вводный абзац, заголовки по годам, у каждого пятого — подраздел"""
+    parts = ["'''Список''' событий по годам.\n"]
+    for index in range(heading_count):
+        parts.append(f"\n== {1800 + index} ==\n")
+        if index % 5 == 0:
+            parts.append("=== Подробнее ===\n")
+        parts.extend(f"* Событие {item} {{{{нет АИ|2020-01-01}}}}\n" for item in range(4))
+    return ''.join(parts)
+
+
+def measure(function, text: str) -> float:
+    """Лучшее время одного вызова в миллисекундах"""
+    timer = timeit.Timer(lambda: function(text))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=3, number=number)) / number * 1000
+
+
+def main():
+    addates = load_script('wp-maintenance-template-add-dates.py', 'wp_maintenance_template_add_dates')
+    for heading_count in (50, 200, 500):
+        text = make_list_article(heading_count)
+        assert addates.find_sections(text) == find_sections_per_heading(text)
+        print(f"{heading_count:4d} заголовков, {len(text) // 1000:4d}k символов: "
+              f"{measure(find_sections_per_heading, text):9.2f} мс -> {measure(addates.find_sections, text):6.2f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import importlib.util
+import os
+import sys
+
+import pytest
+
+# pywikibot не должен искать user-config.py при импорте скрипта
+os.environ.setdefault('PYWIKIBOT_NO_USER_CONFIG', '1')
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Скрипты импортируют общий модуль revision_store из каталога репозитория
+sys.path.insert(0, REPO_DIR)
+
+
+def load_script(filename: str, module_name: str):
+    """Загружает скрипт с дефисами в названии как модуль"""
+    if module_name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(REPO_DIR, filename))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[module_name]
+
+
+@pytest.fixture
+def addates():
+    module = load_script('wp-maintenance-template-add-dates.py', 'wp_maintenance_template_add_dates')
+    # Кэш разбора ревизий хранит результаты по revid, а в тестах revid повторяются
+    module.REVISION_PARSE_CACHE.start_article()
+    return module
+
+
+@pytest.fixture
+def adjuster():
+    return load_script('wp-maintenance-template-date-adjuster.py', 'wp_maintenance_template_date_adjuster')
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Прежняя реализация find_sections (отдельный просмотр строк для каждого уровня заголовка),
+эталон для проверки и замера однопроходного поиска разделов.
+"""
+from typing import List, Tuple
+
+
+def find_sections_per_heading(wikitext: str) -> List[Tuple[str, int, int]]:
+    """
+    Находит все разделы и их позиции в тексте.
+    Возвращает список кортежей (название_раздела, начальная_позиция, конечная_позиция).
+    Вводный раздел (до первого заголовка) определяется как "Вводный раздел".
+    """
+    sections = []
+    current_pos = 0
+    
+    # Сначала найдем первый заголовок, чтобы определить вводный раздел
+    first_section_pos = -1
+    for level in range(2, 7):
+        equals = "=" * level
+        section_start = wikitext.find(f"\n{equals}")
+        if section_start != -1 and (first_section_pos == -1 or section_start < first_section_pos):
+            first_section_pos = section_start
+    
+    # Если есть текст до первого заголовка, добавляем его как вводный раздел
+    if first_section_pos > 0:
+        sections.append(("Вводный раздел", 0, first_section_pos))
+    elif first_section_pos == -1:  # Если заголовков нет вообще
+        sections.append(("Вводный раздел", 0, len(wikitext)))
+        return sections
+    
+    # Теперь найдем все остальные разделы
+    while True:
+        next_section = -1
+        min_level = 99
+        pos = -1
+        
+        for level in range(2, 7):
+            equals = "=" * level
+            section_start = wikitext.find("\n", current_pos)
+            
+            while section_start != -1:
+                line_start = section_start + 1
+                line_end = wikitext.find("\n", line_start)
+                if line_end == -1:
+                    line_end = len(wikitext)
+                
+                line = wikitext[line_start:line_end].strip()
+                
+                # Проверяем, начинается и заканчивается ли строка одинаковым количеством знаков равенства
+                if line.startswith(equals) and line.endswith(equals):
+                    if pos == -1 or section_start < pos:
+                        pos = section_start
+                        next_section = section_start
+                        min_level = level
+                        break
+                
+                section_start = wikitext.find("\n", section_start + 1)
+        
+        if next_section == -1:
+            break
+            
+        section_end = wikitext.find("\n", next_section + 1)
+        if section_end == -1:
+            section_end = len(wikitext)
+        
+        # Извлекаем и очищаем название раздела
+        section_text = wikitext[next_section:section_end]
+        section_name = section_text.strip("= \n")
+        
+        next_section_start = -1
+        for level in range(2, 7):
+            pos = wikitext.find("\n", section_end)
+            while pos != -1:
+                line_start = pos + 1
+                line_end = wikitext.find("\n", line_start)
+                if line_end == -1:
+                    line_end = len(wikitext)
+                
+                line = wikitext[line_start:line_end].strip()
+                if line.startswith('=' * level) and line.endswith('=' * level):
+                    if next_section_start == -1 or pos < next_section_start:
+                        next_section_start = pos
+                        break
+                
+                pos = wikitext.find("\n", pos + 1)
+        
+        if next_section_start == -1:
+            next_section_start = len(wikitext)
+            
+        sections.append((section_name, section_end, next_section_start))
+        current_pos = section_end
+    
+    return sections
+
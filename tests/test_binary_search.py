@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import math
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+TEMPLATES_TO_FIND = [('нет источников', None, {'нет источников': 'Нет источников'})]
+TEMPLATE_KEY = 'нет источников_None'
+RQ_TEMPLATES = {'Rq': 'Rq'}
+
+
+def make_texts(count, addition_index, template='{{нет источников}}'):
+    return [f'Текст {index}.' + (' ' + template if index >= addition_index else '') for index in range(count)]
+
+
+@pytest.fixture
+def on_demand_history(addates, monkeypatch):
+    """Ленивая история: тексты «загружаются» из списка, а не из API"""
+    def make(texts):
+        revisions = [{'revid': 1000 + index, 'timestamp': datetime(2010, 1, 1) + timedelta(hours=index)}
+                     for index in range(len(texts))]
+        by_revid = {1000 + index: text for index, text in enumerate(texts)}
+        monkeypatch.setattr(addates, 'fetch_revision_texts',
+                            lambda site, revids, store=None: {revid: by_revid[revid] for revid in revids})
+        return addates.OnDemandRevisionList(SimpleNamespace(site=None), revisions)
+    return make
+
+
+def find_template(addates, revisions, search_mode):
+    _, results = addates.find_first_appearance(None, revisions, search_mode, templates_to_find=TEMPLATES_TO_FIND,
+                                                sections_to_track=set())
+    return results[TEMPLATE_KEY][1] if TEMPLATE_KEY in results else None
+
+
+def find_concept(addates, revisions, search_mode):
+    results = addates.find_first_appearance(None, revisions, search_mode, template_search=False,
+                                            rq_templates=RQ_TEMPLATES, rq_params=['sources'])
+    return results['sources'][1] if 'sources' in results else None
+
+
+def test_binary_search_fetches_only_probed_texts(addates, on_demand_history):
+    revisions = on_demand_history(make_texts(5000, 3700))
+    assert find_template(addates, revisions, 3) == '4700'
+    # Каждый шаг бинарного поиска загружает только текст проверяемой ревизии
+    assert revisions.fetched_texts <= math.ceil(math.log2(5000))
+
+
+def test_kary_round_fetches_only_its_probes(addates, on_demand_history, monkeypatch):
+    monkeypatch.setitem(addates.CONFIG, 'kary_probes', 4)
+    revisions = on_demand_history(make_texts(5000, 3700))
+    requested = []
+    prefetch = revisions.prefetch
+    monkeypatch.setattr(revisions, 'prefetch', lambda indices: (requested.append(list(indices)), prefetch(indices)))
+
+    assert find_template(addates, revisions, 3) == '4700'
+    # Раунд запрашивает только тексты своих k точек
+    assert all(len(indices) <= 4 for indices in requested)
+    assert revisions.fetched_texts == sum(len(indices) for indices in requested)
+
+
+@pytest.mark.parametrize('kary_probes', [1, 4])
+def test_concept_bisection_fetches_only_probed_texts(addates, on_demand_history, monkeypatch, kary_probes):
+    monkeypatch.setitem(addates.CONFIG, 'kary_probes', kary_probes)
+    revisions = on_demand_history(make_texts(5000, 3700, '{{Rq|sources}}'))
+    requested = []
+    prefetch = revisions.prefetch
+    monkeypatch.setattr(revisions, 'prefetch', lambda indices: (requested.append(list(indices)), prefetch(indices)))
+
+    assert find_concept(addates, revisions, 3) == '4700'
+    assert all(len(indices) <= kary_probes for indices in requested)
+    if kary_probes == 1:
+        assert revisions.fetched_texts <= math.ceil(math.log2(5000))
+
+
+@pytest.fixture
+def paged_history(addates, monkeypatch):
+    """История, метаданные которой «запрашиваются» порциями по 500 ревизий; считает запрошенные порции"""
+    def make(texts):
+        revisions = [{'revid': 1000 + index, 'timestamp': datetime(2010, 1, 1) + timedelta(hours=index)}
+                     for index in range(len(texts))]
+        by_revid = {1000 + index: text for index, text in enumerate(texts)}
+        requested = []
+
+        def iter_revision_batches(page, newest_first):
+            ordered = revisions[::-1] if newest_first else revisions
+            for start in range(0, len(ordered), 500):
+                requested.append(start)
+                yield [dict(rev) for rev in ordered[start:start + 500]]
+
+        monkeypatch.setattr(addates, 'iter_revision_batches', iter_revision_batches)
+        monkeypatch.setattr(addates, 'fetch_revision_texts',
+                            lambda site, revids, store=None: {revid: by_revid[revid] for revid in revids})
+        page = SimpleNamespace(site=None, oldest_revision=SimpleNamespace(timestamp=revisions[0]['timestamp']))
+        return page, requested
+    return make
+
+
+@pytest.mark.parametrize('search_mode, addition_index, expected', [(2, 120, '1120'), (1, 4900, '5900')])
+def test_linear_prefetch_loads_only_first_metadata_batch(addates, paged_history, monkeypatch,
+                                                         search_mode, addition_index, expected):
+    monkeypatch.setitem(addates.CONFIG, 'max_revisions', 0)
+    page, requested = paged_history(make_texts(5000, addition_index))
+
+    history = addates.prefetch_article_history(page, search_mode)
+    assert len(requested) == 1
+    creation_date, revision_count, partial = addates.get_history_summary(history)
+    assert (creation_date, revision_count, partial) == (datetime(2010, 1, 1), 500, True)
+
+    _, _, revisions = addates.get_revision_info(page, search_mode, metadata=history)
+    assert revisions is history
+    assert find_template(addates, revisions, search_mode) == expected
+    # Находка в начале истории не требует остальных 9 порций метаданных
+    assert len(requested) == 1
+
+
+def test_bisection_prefetch_loads_full_metadata(addates, paged_history):
+    page, requested = paged_history(make_texts(5000, 3700))
+
+    history = addates.prefetch_article_history(page, 3)
+    assert len(requested) == 10
+    assert addates.get_history_summary(history) == (datetime(2010, 1, 1), 5000, False)
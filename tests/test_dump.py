@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import bz2
+import gzip
+import json
+import os
+import stat
+
+import pytest
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'pages-meta-history.xml')
+
+
+@pytest.fixture
+def spool(addates, tmp_path):
+    store = addates.RevisionStore(str(tmp_path / 'spool.sqlite'))
+    yield store
+    store.close()
+
+
+def read_pages(addates, filename, spool):
+    return [(title, [dict(rev) for rev in metadata], latest_text)
+            for title, metadata, latest_text in addates.iter_dump_pages(filename, spool)]
+
+
+def compressed_copy(tmp_path, suffix):
+    with open(FIXTURE, 'rb') as source:
+        data = source.read()
+    filename = str(tmp_path / ('pages-meta-history.xml' + suffix))
+    opener = {'.gz': gzip.open, '.bz2': bz2.open}[suffix]
+    with opener(filename, 'wb') as target:
+        target.write(data)
+    return filename
+
+
+def test_iter_dump_pages_yields_main_namespace_articles(addates, spool):
+    pages = read_pages(addates, FIXTURE, spool)
+    # Страница обсуждения и перенаправление пропускаются
+    assert [title for title, _, _ in pages] == ['Тестовая статья']
+    _, metadata, latest_text = pages[0]
+    # Ревизии упорядочены от старых к новым, тексты в метаданных не хранятся
+    assert [rev['revid'] for rev in metadata] == [101, 102, 103]
+    assert [rev['sha1'] for rev in metadata] == ['sha1a', 'sha1b', 'sha1c']
+    assert all('text' not in rev for rev in metadata)
+    assert latest_text.endswith('Дополнение.')
+
+
+@pytest.mark.parametrize('suffix', ['.gz', '.bz2'])
+def test_iter_dump_pages_reads_compressed_dumps(addates, spool, tmp_path, suffix):
+    assert read_pages(addates, compressed_copy(tmp_path, suffix), spool) == read_pages(addates, FIXTURE, spool)
+
+
+def test_dump_revision_list_reads_spooled_texts(addates, spool):
+    title, metadata, latest_text = next(addates.iter_dump_pages(FIXTURE, spool))
+    page = addates.DumpPage(None, title, latest_text, metadata[-1]['revid'])
+
+    oldest_first = addates.DumpRevisionList(page, newest_first=False, metadata=metadata, spool=spool)
+    texts = [rev['text'] for rev in oldest_first]
+    assert texts[0].startswith("'''Тестовая статья'''")
+    assert texts[1].startswith('{{Нет источников}}')
+    assert texts[2] == latest_text
+
+    newest_first = addates.DumpRevisionList(page, newest_first=True, metadata=metadata, spool=spool)
+    assert [rev['revid'] for rev in newest_first] == [103, 102, 101]
+    assert newest_first[0]['text'] == latest_text
+
+
+def test_process_dump_writes_proposed_edits(addates, tmp_path, monkeypatch):
+    output_file = tmp_path / 'proposed.jsonl'
+    monkeypatch.setitem(addates.CONFIG, 'dump_file', FIXTURE)
+    monkeypatch.setitem(addates.CONFIG, 'dump_output_file', str(output_file))
+    monkeypatch.setattr(addates, 'REVISION_STORE', None)
+    # Редиректы шаблона Rq в режиме дампа запрашиваются у сайта
+    monkeypatch.setattr(addates, 'get_rq_template_redirects', lambda site: {'rq': 'Rq'})
+
+    templates = {'Нет источников': {'Нет источников': 'Нет источников'}}
+    for search_mode in (1, 2, 3, 4):
+        # Поиск по истории берёт режим из CONFIG, как при запуске через main()
+        monkeypatch.setitem(addates.CONFIG, 'search_mode', search_mode)
+        addates.REVISION_PARSE_CACHE.start_article()
+        addates.process_dump(None, templates, search_mode)
+        edits = [json.loads(line) for line in output_file.read_text(encoding='utf-8').splitlines()]
+        assert len(edits) == 1
+        assert edits[0]['title'] == 'Тестовая статья'
+        assert edits[0]['base_revid'] == 103
+        assert 'Special:Diff/102|2020-06-15' in edits[0]['summary']
+        assert edits[0]['text'].startswith('{{Нет источников|дата=2020-06-15}}')
+
+
+def fake_7z(tmp_path, monkeypatch, exit_code):
+    # Вместо настоящей утилиты 7z — скрипт, который выводит дамп и завершается с заданным кодом
+    script = tmp_path / 'bin' / '7z'
+    script.parent.mkdir()
+    script.write_text(f'#!/bin/sh\ncat "{FIXTURE}"\nexit {exit_code}\n')
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', str(script.parent) + os.pathsep + os.environ.get('PATH', ''))
+    return str(tmp_path / 'pages-meta-history.xml.7z')
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='скрипт-заглушка 7z написан для sh')
+def test_7z_dump_is_read_through_7z(addates, spool, tmp_path, monkeypatch):
+    filename = fake_7z(tmp_path, monkeypatch, 0)
+    assert [title for title, _, _ in read_pages(addates, filename, spool)] == ['Тестовая статья']
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='скрипт-заглушка 7z написан для sh')
+def test_7z_failure_is_reported(addates, spool, tmp_path, monkeypatch):
+    filename = fake_7z(tmp_path, monkeypatch, 2)
+    with pytest.raises(RuntimeError, match='кодом 2'):
+        read_pages(addates, filename, spool)
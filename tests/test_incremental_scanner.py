@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+
+import pytest
+
+TEMPLATES_TO_FIND = [('нет источников', None, {'нет источников': 'Нет источников'})]
+
+
+def make_rev(revid: int, text: str) -> dict:
+    return {'revid': revid, 'timestamp': datetime(2020, 1, revid), 'text': text}
+
+
+def scan_pair(addates, previous_text: str, text: str):
+    scanner = addates.IncrementalTemplateScanner(TEMPLATES_TO_FIND)
+    scanner.check(make_rev(1, previous_text))
+    results = scanner.check(make_rev(2, text))
+    return scanner, results
+
+
+@pytest.mark.parametrize('previous_text, text', [
+    # Правка открывает комментарий вокруг шаблона
+    ("Intro <!- c {{нет источников}} --> more", "Intro <!-- c {{нет источников}} --> more"),
+    ("Intro <!-- c {{нет источников}} --> more", "Intro <!- c {{нет источников}} --> more"),
+    # Удаление "-" из закрывающего "-->" перед шаблоном продлевает комментарий до следующего "-->"
+    ("Intro <!-- a --> {{нет источников}} <!-- b --> more", "Intro <!-- a -> {{нет источников}} <!-- b --> more"),
+    ("Intro <!-- a -> {{нет источников}} <!-- b --> more", "Intro <!-- a --> {{нет источников}} <!-- b --> more"),
+    # Комментарий закрывается на другой строке
+    ("Intro <!- c\n{{нет источников}}\n--> more", "Intro <!-- c\n{{нет источников}}\n--> more"),
+])
+def test_comment_edits_are_not_reused(addates, previous_text, text):
+    scanner, results = scan_pair(addates, previous_text, text)
+    assert scanner.reused == 0
+    assert results == addates.check_templates_in_revision(make_rev(2, text), TEMPLATES_TO_FIND)
+
+
+def test_plain_text_edit_is_reused(addates):
+    scanner, results = scan_pair(addates, "Intro {{нет источников}} word", "Intro {{нет источников}} words")
+    assert scanner.reused == 1
+    assert results == addates.check_templates_in_revision(make_rev(2, "Intro {{нет источников}} words"),
+                                                          TEMPLATES_TO_FIND)
+
+
+@pytest.mark.parametrize('previous_text, text', [
+    # Удаление символа между двумя скобками создаёт шаблон, хотя сами скобки не изменились
+    ('x{a{нет источников}} y', 'x{{нет источников}} y'),
+    ('x {{нет источников}a} y', 'x {{нет источников}} y'),
+    # И наоборот, вставка символа между скобками разрушает шаблон
+    ('x{{нет источников}} y', 'x{a{нет источников}} y'),
+    ('x {{нет источников}} y', 'x {{нет источников}a} y'),
+])
+def test_edits_next_to_braces_are_not_reused(addates, previous_text, text):
+    scanner, results = scan_pair(addates, previous_text, text)
+    assert scanner.reused == 0
+    assert results == addates.check_templates_in_revision(make_rev(2, text), TEMPLATES_TO_FIND)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+TEMPLATES_TO_FIND = [
+    ('нет источников', None, {'нет источников': 'Нет источников'}),
+    ('стиль раздела', 'section', {'стиль раздела': 'Стиль раздела'}),
+]
+
+
+def make_history(count=350, seed=7):
+    """История с добавлением и удалением шаблонов, переименованием разделов и скрытыми ревизиями"""
+    rng = random.Random(seed)
+    article_template, section_template, heading = False, False, 'История'
+    revisions = []
+    for index in range(count):
+        if rng.random() < 0.05:
+            article_template = not article_template
+        if rng.random() < 0.05:
+            section_template = not section_template
+        if rng.random() < 0.02:
+            heading = rng.choice(['История', 'Истории', 'Биография', 'Память'])
+        text = (('{{нет источников}}\n' if article_template else '') + f'Вступление {rng.randint(0, 3)}.\n'
+                f'== {heading} ==\n' + ('{{стиль раздела}}\n' if section_template else '') + f'Текст {index}.')
+        revisions.append({'revid': 1000 + index, 'timestamp': datetime(2015, 1, 1) + timedelta(hours=index),
+                          'text': None if rng.random() < 0.03 else text})
+    return revisions
+
+
+@pytest.fixture
+def parse_pool(addates, monkeypatch):
+    monkeypatch.setitem(addates.CONFIG, 'parse_workers', 2)
+    yield
+    addates.shutdown_parse_pool()
+    assert addates.PARSE_POOL is None
+
+
+def scan(addates, revisions, **kwargs):
+    return [(rev_idx, rev['revid'], results, section_names)
+            for rev_idx, rev, results, section_names in addates.iter_revision_template_results(
+                revisions, TEMPLATES_TO_FIND, with_sections=True, **kwargs)]
+
+
+@pytest.mark.parametrize('start_index', [0, 17])
+def test_pooled_results_match_serial_in_order(addates, parse_pool, start_index):
+    revisions = make_history()
+    pooled = scan(addates, revisions, start_index=start_index)
+    assert addates.PARSE_POOL is not None
+
+    addates.CONFIG['parse_workers'] = 0
+    addates.REVISION_PARSE_CACHE.start_article()
+    assert pooled == scan(addates, revisions, start_index=start_index)
+    # Порядок ревизий сохраняется, а результаты совпадают с разбором каждой ревизии отдельно
+    assert [rev_idx for rev_idx, _, _, _ in pooled] == list(range(start_index, len(revisions)))
+    for rev_idx, _, results, _ in pooled:
+        assert results == addates.check_templates_in_revision(revisions[rev_idx], TEMPLATES_TO_FIND)
+
+
+def test_pooled_results_follow_revert_jumps(addates, parse_pool):
+    revisions = make_history()
+    revert_jumps = {10: 20, 150: 160, 300: 302}
+    pooled = scan(addates, revisions, revert_jumps=revert_jumps)
+
+    addates.CONFIG['parse_workers'] = 0
+    addates.REVISION_PARSE_CACHE.start_article()
+    assert pooled == scan(addates, revisions, revert_jumps=revert_jumps)
+    assert 15 not in [rev_idx for rev_idx, _, _, _ in pooled]
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import hashlib
+from datetime import datetime, timedelta
+
+import pytest
+
+TEMPLATES_TO_FIND = [('нет источников', None, {'нет источников': 'Нет источников'})]
+
+
+def make_history(texts):
+    return [{'revid': 1000 + index, 'timestamp': datetime(2020, 1, 1) + timedelta(days=index),
+             'size': len(text.encode('utf-8')), 'sha1': hashlib.sha1(text.encode('utf-8')).hexdigest(), 'text': text}
+            for index, text in enumerate(texts)]
+
+
+def first_appearance(addates, revisions, skip_reverts):
+    _, results = addates.find_first_appearance(None, revisions, 2, templates_to_find=TEMPLATES_TO_FIND,
+                                                sections_to_track=set(), skip_reverts=skip_reverts)
+    return results['нет источников_None'][1]
+
+
+def test_blankings_are_not_revert_anchors(addates):
+    # Шаблон добавлен в ревизии 10, страница очищалась в ревизиях 1 и 15, остальные тексты различаются
+    texts = [f'Текст {index}.' + (' {{нет источников}}' if index >= 10 else '') for index in range(17)]
+    texts[1] = texts[15] = ''
+    revisions = make_history(texts)
+
+    assert addates.find_revert_jumps(revisions) == {}
+    assert first_appearance(addates, revisions, True) == first_appearance(addates, revisions, False) == '1010'
+
+
+def test_revert_jumps_to_nearest_identical_text_within_window(addates):
+    texts = [f'Текст {index}.' for index in range(40)]
+    texts[5] = texts[8] = texts[12] = texts[2]  # Три отката к тексту ревизии 2
+    texts[30] = texts[12]                        # Слишком далеко от ревизии 12
+    revisions = make_history(texts)
+
+    assert addates.find_revert_jumps(revisions) == {2: 5, 5: 8, 8: 12}
+
+
+def test_reverted_vandalism_is_skipped(addates):
+    # Шаблон, добавленный вандалом в ревизии 3 и откаченный в ревизии 4, не считается первым появлением
+    texts = [f'Текст {index}.' + (' {{нет источников}}' if index >= 7 else '') for index in range(10)]
+    texts[3] = texts[2] + ' {{нет источников}}'
+    texts[4] = texts[2]
+    revisions = make_history(texts)
+
+    assert first_appearance(addates, revisions, False) == '1003'
+    assert first_appearance(addates, revisions, True) == '1007'
+
+
+def test_default_search_does_not_skip_reverts(addates, monkeypatch):
+    # skip_reverts меняет ответ, поэтому по умолчанию (CONFIG['skip_reverts'] = False) откаты не ищутся
+    texts = [f'Текст {index}.' + (' {{нет источников}}' if index >= 7 else '') for index in range(10)]
+    texts[3] = texts[2] + ' {{нет источников}}'
+    texts[4] = texts[2]
+    revisions = make_history(texts)
+    monkeypatch.setitem(addates.CONFIG, 'skip_reverts', False)
+    monkeypatch.setattr(addates, 'find_revert_jumps', lambda revisions: pytest.fail('откаты не должны искаться'))
+
+    for search_mode, expected in ((1, '1007'), (2, '1003')):
+        _, results = addates.find_first_appearance(None, revisions, search_mode, templates_to_find=TEMPLATES_TO_FIND,
+                                                    sections_to_track=set())
+        assert results['нет источников_None'][1] == expected
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from revision_store import SQLITE_MAX_PARAMETERS, RevisionStore, fetch_revision_texts
+
+
+def test_get_many_splits_large_requests(tmp_path):
+    store = RevisionStore(str(tmp_path / 'store.sqlite'))
+    count = SQLITE_MAX_PARAMETERS * 2 + 1
+    store.put_many({revid: f'текст {revid}' for revid in range(count)})
+    store.put_many({count: None})  # Скрытая ревизия не сохраняется
+
+    texts = store.get_many(list(range(count + 2)))
+    assert len(texts) == count
+    assert texts[count - 1] == f'текст {count - 1}'
+    assert (store.hits, store.misses) == (count, 2)
+    store.close()
+
+
+def test_adjuster_reads_texts_from_shared_store(adjuster, tmp_path):
+    filename = str(tmp_path / 'store.sqlite')
+    store = RevisionStore(filename)
+    store.put_many({1: 'первая', 2: 'вторая'})
+    store.close()
+
+    shared = adjuster.open_revision_store(filename)
+    # Все тексты есть в хранилище, поэтому запросов к API нет и сайт не нужен
+    assert fetch_revision_texts(None, [1, 2], shared) == {1: 'первая', 2: 'вторая'}
+    assert shared.hits == 2
+    shared.close()
+
+
+def test_scripts_share_one_fetch_function(addates, adjuster):
+    assert addates.fetch_revision_texts is adjuster.fetch_revision_texts is fetch_revision_texts
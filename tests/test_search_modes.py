@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+TEMPLATES_TO_FIND = [('нет источников', None, {'нет источников': 'Нет источников'})]
+TEMPLATE_KEY = 'нет источников_None'
+RQ_TEMPLATES = {'Rq': 'Rq'}
+
+# (число ревизий, индекс добавления шаблона, индексы скрытых ревизий)
+HISTORIES = [
+    (1, 0, ()),
+    (2, 1, ()),
+    (40, 0, ()),             # Шаблон есть с первой ревизии
+    (40, 39, ()),            # Шаблон только в последней ревизии
+    (40, 40, ()),            # Шаблона нет ни в одной ревизии
+    (257, 101, ()),
+    (1000, 997, ()),
+    (200, 120, (3, 50, 119, 121, 150, 199)),  # Скрытые ревизии до и после добавления
+    (200, 120, tuple(range(100, 140))),       # Добавление внутри длинной полосы скрытых ревизий
+    (30, 0, (0, 1, 2)),                        # Первые ревизии скрыты
+]
+
+
+def make_history(count, addition_index, hidden, template):
+    return [{'revid': 1000 + index, 'timestamp': datetime(2010, 1, 1) + timedelta(hours=index),
+             'text': None if index in hidden else f'Текст {index}.' + (' ' + template if index >= addition_index else '')}
+            for index in range(count)]
+
+
+def make_on_demand(addates, monkeypatch, history):
+    by_revid = {rev['revid']: rev['text'] for rev in history}
+    monkeypatch.setattr(addates, 'fetch_revision_texts',
+                        lambda site, revids, store=None: {revid: by_revid[revid] for revid in revids})
+    metadata = [{'revid': rev['revid'], 'timestamp': rev['timestamp']} for rev in history]
+    return addates.OnDemandRevisionList(SimpleNamespace(site=None), metadata)
+
+
+def find_template(addates, revisions, search_mode):
+    _, results = addates.find_first_appearance(None, revisions, search_mode, templates_to_find=TEMPLATES_TO_FIND,
+                                                sections_to_track=set())
+    return results[TEMPLATE_KEY][:2] if TEMPLATE_KEY in results else None
+
+
+def find_concept(addates, revisions, search_mode):
+    results = addates.find_first_appearance(None, revisions, search_mode, template_search=False,
+                                            rq_templates=RQ_TEMPLATES, rq_params=['sources'])
+    return results['sources'][:2] if 'sources' in results else None
+
+
+@pytest.mark.parametrize('count, addition_index, hidden', HISTORIES)
+@pytest.mark.parametrize('search_mode, kary_probes', [(3, 1), (4, 1), (3, 3), (4, 4)])
+def test_template_bisection_matches_linear_search(addates, monkeypatch, count, addition_index, hidden,
+                                                  search_mode, kary_probes):
+    monkeypatch.setitem(addates.CONFIG, 'kary_probes', kary_probes)
+    history = make_history(count, addition_index, hidden, '{{нет источников}}')
+    expected = find_template(addates, [dict(rev) for rev in history], 2)
+    assert find_template(addates, [dict(rev) for rev in history], search_mode) == expected
+    assert find_template(addates, make_on_demand(addates, monkeypatch, history), search_mode) == expected
+
+
+@pytest.mark.parametrize('count, addition_index, hidden', HISTORIES)
+@pytest.mark.parametrize('search_mode, kary_probes', [(3, 1), (4, 1), (3, 3), (4, 4)])
+def test_concept_bisection_matches_linear_search(addates, monkeypatch, count, addition_index, hidden,
+                                                 search_mode, kary_probes):
+    monkeypatch.setitem(addates.CONFIG, 'kary_probes', kary_probes)
+    history = make_history(count, addition_index, hidden, '{{Rq|sources}}')
+    expected = find_concept(addates, [dict(rev) for rev in history], 2)
+    assert find_concept(addates, [dict(rev) for rev in history], search_mode) == expected
+    assert find_concept(addates, make_on_demand(addates, monkeypatch, history), search_mode) == expected
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+
+import pytest
+
+TEMPLATES_TO_FIND = [('дописать', 'История', {'дописать': 'Дописать'})]
+
+
+def make_history():
+    texts = ['Вводный.\n== Истории ==\nТекст.\n'] * 5 + ['Вводный.\n== История ==\nТекст. {{дописать}}\n'] * 5
+    return [{'revid': 100 + index, 'timestamp': datetime(2020, 1, 1) + timedelta(days=index), 'text': text}
+            for index, text in enumerate(texts)]
+
+
+@pytest.mark.parametrize('search_mode', [1, 2])
+def test_section_history_is_printed_once_linear_pass_completes(addates, capsys, search_mode):
+    section_history, results = addates.find_first_appearance(
+        None, make_history(), search_mode, templates_to_find=TEMPLATES_TO_FIND, sections_to_track={'История'})
+
+    assert results['дописать_История'][1] == '105'
+    assert sorted(section_history['История']) == ['Истории', 'История']
+    output = capsys.readouterr().out
+    # История собирается в том же проходе, что и поиск шаблонов: прогресс поиска и досбор
+    # истории в непроверенных ревизиях выводятся по ходу, а сама история — один раз в конце
+    assert output.count('📊 История раздела «История»') == 1
+    assert output.index('шаблонов') < output.index('📊 История раздела')
+    assert output.rfind('Поиск истории разделов') < output.index('📊 История раздела')
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import random
+
+import pytest
+
+from legacy_sections import find_sections_per_heading
+
+SECTION_TEXTS = [
+    "Только вводный раздел без заголовков.",
+    "== История ==\nТекст сразу с заголовка.",
+    "Вводный.\n== История ==\nТекст.\n=== Ранние годы ===\nТекст.\n==== Детство ====\n===== Школа =====\n====== Класс ======\nКонец.",
+    # Заголовки внутри комментариев и <nowiki> ищутся по тексту, как и раньше
+    "Вводный.\n<!--\n== Скрытый ==\n-->\n== Видимый ==\nТекст.",
+    "Вводный.\n<nowiki>\n== Не заголовок ==\n</nowiki>\n== Заголовок ==",
+    # Знаки "=" внутри шаблонов и параметров
+    "Вводный {{шаблон|a=b|c==d}}.\n== Раздел {{tl|x=y}} ==\n{{карточка\n|поле = значение\n|== = ==\n}}\nТекст.",
+    # Несбалансированные и неполные заголовки
+    "Вводный.\n== Слева два ===\nТекст.\n=== Справа два ==\n== Без конца\n= Уровень один =\n==\n====",
+    # Пробелы, табуляция и \r вокруг заголовков, пустые строки
+    "Вводный.\n  == С пробелами ==  \n\t== С табуляцией ==\t\n== С возвратом каретки ==\r\n\n\n== Последний ==",
+]
+
+
+@pytest.mark.parametrize('text', SECTION_TEXTS)
+def test_find_sections_matches_per_heading_scan(addates, text):
+    assert addates.find_sections(text) == find_sections_per_heading(text)
+
+
+def test_find_sections_matches_per_heading_scan_on_random_texts(addates):
+    pieces = ['\n', '=', '==', '===', ' ', '\t', '\r', '\x85', 'а', 'текст', '{{t|a=b}}', '<!--', '-->',
+              '\n== Раздел ==\n', '\n=== Подраздел ===\n']
+    rng = random.Random(12)
+    for _ in range(3000):
+        text = ''.join(rng.choice(pieces) for _ in range(rng.randint(0, 40)))
+        assert addates.find_sections(text) == find_sections_per_heading(text), repr(text)
+
+
+def test_sections_at_positions_match_linear_scan(addates):
+    text = SECTION_TEXTS[2]
+    sections = addates.find_sections(text)
+    positions = list(range(len(text) + 1))
+    expected = []
+    for pos in positions:
+        for section_name, start_pos, end_pos in sections:
+            if start_pos <= pos < end_pos and section_name not in expected:
+                expected.append(section_name)
+                break
+    assert addates.get_sections_at_positions(positions, sections) == expected
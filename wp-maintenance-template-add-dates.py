@@ -1,28 +1,53 @@
 # -*- coding: utf-8 -*-
 import pywikibot
+from pywikibot.data import api
 import re
 import mwparserfromhell
 from datetime import datetime
-from typing import Dict, List, Set, Tuple, Optional, Union
+from typing import Dict, List, Set, Tuple, Optional, Union, Iterator
 import platform
 import time
 import sys
 from difflib import SequenceMatcher
+from functools import lru_cache
+from contextlib import contextmanager
 import json
+import bisect
+import hashlib
+import sqlite3
+import bz2
+import gzip
+import subprocess
+import tempfile
+import os
+import xml.etree.ElementTree as ElementTree
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from revision_store import REVISION_TEXT_BATCH_SIZE, RevisionStore, fetch_revision_texts
 
 # Конфигурация
 CONFIG = {
-    'mode': 'rq',  # Режим обработки: 'meta', 'single', 'rq', 'metarq'.
-    'search_mode': 2,  # 1 - линейный поиск от последней ревизии, 2 - линейный поиск от первой ревизии, 3 - бинарный поиск от первой ревизии
+    'mode': 'rq',  # Режим обработки: 'meta', 'single', 'rq', 'metarq', 'dump'.
+    'search_mode': 2,  # 1 - линейный поиск от последней ревизии, 2 - линейный поиск от первой ревизии, 3 - бинарный поиск от первой ревизии, 4 - галоп от последней ревизии с бинарным поиском
     'max_revisions': 0,  # Пропускать статьи, если количество ревизий превышает это значение (0 - без ограничений)
 
     'debug_article': "",  # Название статьи для отладки. Если указано, скрипт обработает только эту статью с логикой, соответствующbим CONFIG['mode'].
     'debug_output': False,  # Включить/выключить отладочный вывод
     'autosave': True,  # Автоматическое сохранение изменений в статьи
+    'revision_cache_file': "revision_texts_cache.sqlite",  # Локальное хранилище текстов ревизий ("" - не использовать)
+    'prefetch_depth': 4,  # Сколько следующих статей загружать в фоне, пока обрабатывается текущая (0 - без предзагрузки)
+    'parse_workers': 0,  # Количество процессов для разбора текстов ревизий в режимах поиска 1 и 2 (0 - разбор в основном процессе)
+    'kary_probes': 1,  # Сколько ревизий проверять за один раунд бинарного поиска и галопа (режимы 3 и 4); тексты всех точек раунда загружаются одним запросом
+    'skip_reverts': False,  # В режимах поиска 1 и 2 не проверять правки, отменённые откатом к тексту с тем же sha1 (меняет найденные даты, см. README)
+    'parse_cache_mb': 64,  # Предел памяти кэша разбора ревизий текущей статьи, МБ (0 - не использовать)
 
     'meta_category': "Категория:Отслеживающие категории:Статьи с шаблонами-сообщениями без указанных дат",
     'single_category': "Категория:Википедия:Статьи, нейтральность которых поставлена под сомнение без указанной даты",
     'rq_category': "Категория:Википедия:Статьи к замене параметров шаблона rq",
+
+    # Режим 'dump': обработка полной истории правок из XML-дампа pages-meta-history без запросов истории к API
+    'dump_file': "",  # Путь к дампу (.xml, .xml.bz2, .xml.gz или .xml.7z)
+    'dump_output_file': "dump_proposed_edits.jsonl",  # Файл для предлагаемых правок (по одной JSON-строке на статью)
 }
 
 # Шаблоны, которые нужно обрабатывать с учетом разделов
@@ -109,10 +134,44 @@ RQ_PARAM_TEMPLATES = {
 # Список параметров шаблона Rq, при наличии которых пропускаем обработку статьи
 RQ_SKIP_PARAMS = ["all", "infobox2", "imdb", "fromlang"]
 
+# Количество статей, текущие версии которых загружаются одним запросом
+ARTICLE_PRELOAD_BATCH_SIZE = 50
+
+# Размеры кэшей нормализованных названий разделов и результатов их попарного сравнения
+SECTION_NAME_CACHE_SIZE = 16384
+SECTION_SIMILARITY_CACHE_SIZE = 65536
+
+# Строка-кандидат в заголовки разделов: перевод строки, пробелы и "==" в начале строки
+SECTION_HEADING_CANDIDATE = re.compile(r'\n[^\S\n]*==[^\n]*')
+
+# Ревизий в одной порции при параллельном разборе текстов (CONFIG['parse_workers'])
+PARSE_CHUNK_SIZE = 100
+
+# Сколько правок подряд может отменить откат (как $wgRevertedTagMaxDepth в MediaWiki)
+REVERT_MAX_DEPTH = 15
+
+# sha1 пустого текста: очистки страницы не считаются откатами друг к другу
+EMPTY_TEXT_SHA1 = hashlib.sha1(b'').hexdigest()
+
+# Пул процессов для разбора текстов ревизий, создаётся при первой необходимости
+PARSE_POOL: Optional[ProcessPoolExecutor] = None
+
+# Скомпилированные выражения быстрой проверки наличия шаблонов (по набору названий)
+TEMPLATE_PREFILTER_CACHE: Dict[frozenset, re.Pattern] = {}
+
+# Словари поиска записей templates_to_find по каноническому ключу названия шаблона
+TEMPLATE_MATCHER_CACHE: Dict[tuple, Dict[str, List[int]]] = {}
+
+# Редиректы шаблона Rq, загружаются один раз за запуск
+RQ_TEMPLATE_REDIRECTS_CACHE: Dict[str, str] = {}
+
 # Глобальный кэш для редиректов самостоятельных шаблонов, используемый при обработке Rq
 RQ_STANDALONE_REDIRECT_CACHE: Dict[str, Dict[str, str]] = {}
 RQ_STANDALONE_REDIRECT_CACHE_FILE = "rq_standalone_redirects_cache.json"
 
+# Локальное хранилище текстов ревизий, открывается в main()
+REVISION_STORE: Optional[RevisionStore] = None
+
 # Словарь для нормализации значений параметра topic в шаблоне Rq
 RQ_TOPIC_NORMALIZATION_MAP: Dict[str, str] = {
     # Канонический : вариант (все в нижнем регистре)
@@ -166,28 +225,483 @@ def print_debug(message: str) -> None:
 def print_article_header(page: pywikibot.Page, creation_date: datetime, revision_count: int,
                         current_article: int, category_articles: int,
                         current_category: int, total_categories: int,
-                        processed_articles: int, total_articles: int) -> None:
+                        processed_articles: int, total_articles: int,
+                        revision_count_is_partial: bool = False) -> None:
+    # Для не полностью загруженной ленивой истории известно только, сколько ревизий уже загружено
+    revision_count_text = f"{revision_count}+" if revision_count_is_partial else str(revision_count)
     print(f"⬜️⬜️⬜️ {page.title()}")
-    print(f"    ✏️ Создана: {creation_date.strftime('%Y-%m-%d')}    📝 Всего ревизий: {revision_count}    📊 Прогресс: {current_article}/{category_articles}, категория {current_category}/{total_categories}, всего {processed_articles}/{total_articles}")
+    print(f"    ✏️ Создана: {creation_date.strftime('%Y-%m-%d')}    📝 Всего ревизий: {revision_count_text}    📊 Прогресс: {current_article}/{category_articles}, категория {current_category}/{total_categories}, всего {processed_articles}/{total_articles}")
+
+def open_revision_store() -> Optional[RevisionStore]:
+    """Открывает хранилище текстов ревизий, если оно включено в CONFIG"""
+    filename = CONFIG.get('revision_cache_file')
+    if not filename:
+        return None
+    try:
+        store = RevisionStore(filename)
+        print_debug(f"    💾  Хранилище текстов ревизий открыто: {filename}")
+        return store
+    except sqlite3.Error as e:
+        print(f"⚠️ Не удалось открыть хранилище текстов ревизий {filename}: {e}")
+        return None
+
+def revision_from_api(rev: Dict) -> Dict:
+    """Преобразует метаданные ревизии из ответа API (formatversion=2) в словарь, с которым работает скрипт"""
+    rev_dict = {
+        'revid': rev['revid'],
+        'timestamp': pywikibot.Timestamp.fromISOformat(rev['timestamp']),
+    }
+    for prop in ('size', 'sha1'):
+        if prop in rev:
+            rev_dict[prop] = rev[prop]
+    return rev_dict
+
+def iter_revision_batches(page: pywikibot.Page, newest_first: bool) -> Iterator[List[Dict]]:
+    """
+    Постранично запрашивает метаданные истории правок статьи через API в заданном направлении.
+    Каждая следующая порция запрашивается только тогда, когда потребитель дошёл до неё,
+    поэтому прекращение итерации останавливает и загрузку.
+    """
+    parameters = {
+        'action': 'query',
+        'prop': 'revisions',
+        'titles': page.title(),
+        'rvprop': 'ids|timestamp|size|sha1',
+        'rvlimit': 'max',
+        'rvdir': 'older' if newest_first else 'newer',
+        'formatversion': 2,
+    }
+
+    while True:
+        data = api.Request(site=page.site, parameters=parameters).submit()
+        batch = []
+        for page_data in data.get('query', {}).get('pages', []):
+            for rev in page_data.get('revisions', []):
+                batch.append(revision_from_api(rev))
+        if batch:
+            yield batch
+        if 'continue' not in data:
+            break
+        parameters.update(data['continue'])
+
+class OnDemandRevisionList:
+    """
+    История правок для бинарного поиска и галопа (search_mode 3 и 4).
+    Сразу загружаются только метаданные всех ревизий (revid, timestamp, size, sha1),
+    а текст ревизии запрашивается при первом обращении к ней.
+    Проверяемые ревизии можно заранее запросить одним пакетом через prefetch().
+    """
+
+    def __init__(self, page: pywikibot.Page, revisions: List[Dict]):
+        self.page = page
+        self._revisions = revisions
+        self.fetched_texts = 0  # Сколько текстов ревизий реально загружено
+
+    def _available(self, index: int) -> bool:
+        return 0 <= index < len(self._revisions)
+
+    def prefetch(self, indices: List[int]) -> None:
+        """Загружает одним пакетом тексты ещё не загруженных ревизий с указанными индексами"""
+        missing_indices = [i for i in sorted(set(indices))
+                           if self._available(i) and 'text' not in self._revisions[i]]
+        if not missing_indices:
+            return
+        texts = fetch_revision_texts(self.page.site, [self._revisions[i]['revid'] for i in missing_indices], REVISION_STORE)
+        self.fetched_texts += len(missing_indices)
+        for i in missing_indices:
+            self._revisions[i]['text'] = texts.get(self._revisions[i]['revid'])
+
+    def metadata(self, index: int) -> Dict:
+        """Возвращает ревизию без загрузки её текста (текст есть, только если уже загружен)"""
+        if not self._available(index):
+            raise IndexError(index)
+        return self._revisions[index]
+
+    def __len__(self) -> int:
+        return len(self._revisions)
+
+    def __getitem__(self, index: int) -> Dict:
+        if index < 0:
+            index += len(self)
+        if not self._available(index):
+            raise IndexError(index)
+        if 'text' not in self._revisions[index]:
+            self.prefetch([index])
+        return self._revisions[index]
+
+    def __iter__(self) -> Iterator[Dict]:
+        # При последовательном проходе тексты загружаются пакетами наперёд
+        index = 0
+        while self._available(index):
+            if 'text' not in self._revisions[index]:
+                self.prefetch(list(range(index, index + REVISION_TEXT_BATCH_SIZE)))
+            yield self._revisions[index]
+            index += 1
+
+class RevisionStream(OnDemandRevisionList):
+    """
+    Ленивая история правок статьи в направлении поиска: от старых к новым (search_mode 2)
+    или от новых к старым (search_mode 1).
+    Метаданные и тексты ревизий запрашиваются порциями по мере обращения к ним и сохраняются,
+    поэтому повторный проход (например, поиск Rq-параметров, а затем самостоятельных шаблонов)
+    не загружает их заново.
+    """
+
+    def __init__(self, page: pywikibot.Page, newest_first: bool, revision_count: Optional[int] = None,
+                 metadata: Optional[List[Dict]] = None):
+        super().__init__(page, [])
+        self.newest_first = newest_first
+        self.revision_count = revision_count  # Ожидаемое количество ревизий (для прогресса)
+        self._oldest_timestamp: Optional[datetime] = None
+        if metadata is not None:
+            # Метаданные уже загружены заранее (от старых к новым), лениво загружаются только тексты
+            self._revisions = list(reversed(metadata)) if newest_first else list(metadata)
+            self._batches = iter(())
+            self._exhausted = True
+        else:
+            self._batches = iter_revision_batches(page, newest_first)
+            self._exhausted = False
+
+    def _available(self, index: int) -> bool:
+        """Догружает порции метаданных, пока не станет доступна ревизия с индексом index"""
+        while index >= len(self._revisions) and not self._exhausted:
+            try:
+                self._revisions.extend(next(self._batches))
+            except StopIteration:
+                self._exhausted = True
+        return 0 <= index < len(self._revisions)
+
+    def _load_all(self) -> None:
+        while not self._exhausted:
+            self._available(len(self._revisions))
+
+    @property
+    def is_complete(self) -> bool:
+        """Загружены ли метаданные всей истории"""
+        return self._exhausted
+
+    def oldest_timestamp(self) -> Optional[datetime]:
+        """
+        Дата самой старой ревизии (создания статьи): из уже загруженных метаданных,
+        а если история идёт от новых ревизий и загружена не полностью — одним запросом первой ревизии.
+        """
+        if not self._available(0):
+            return None
+        if not self.newest_first:
+            return self._revisions[0]['timestamp']
+        if self._exhausted:
+            return self._revisions[-1]['timestamp']
+        if self._oldest_timestamp is None:
+            self._oldest_timestamp = self.page.oldest_revision.timestamp
+        return self._oldest_timestamp
+
+    def __len__(self) -> int:
+        # Пока история не загружена полностью, длина — оценка (для прогресса и условий выхода)
+        self._available(0)
+        if self._exhausted:
+            return len(self._revisions)
+        return max(self.revision_count or 0, len(self._revisions))
+
+    def __bool__(self) -> bool:
+        return self._available(0)
+
+    def __getitem__(self, index: int) -> Dict:
+        if index < 0:
+            self._load_all()
+        return super().__getitem__(index)
+
+    def __reversed__(self) -> Iterator[Dict]:
+        self._load_all()
+        for index in range(len(self._revisions) - 1, -1, -1):
+            if 'text' not in self._revisions[index]:
+                self.prefetch(list(range(index - REVISION_TEXT_BATCH_SIZE + 1, index + 1)))
+            yield self._revisions[index]
+
+def get_revision_metadata(page: pywikibot.Page) -> List[Dict]:
+    """Загружает метаданные всех ревизий статьи (от старых к новым) без текстов"""
+    return [rev for batch in iter_revision_batches(page, newest_first=False) for rev in batch]
+
+def iter_preloaded_pages(site: pywikibot.Site, category: pywikibot.Category) -> Iterator[pywikibot.Page]:
+    """
+    Перебирает статьи категории, заранее загружая текущие тексты и последние ревизии
+    пакетами по ARTICLE_PRELOAD_BATCH_SIZE статей за запрос.
+    """
+    batch = []
+    for page in category.articles():
+        batch.append(page)
+        if len(batch) == ARTICLE_PRELOAD_BATCH_SIZE:
+            yield from _iter_preloaded_batch(site, batch)
+            batch = []
+    if batch:
+        yield from _iter_preloaded_batch(site, batch)
+
+def _iter_preloaded_batch(site: pywikibot.Site, pages: List[pywikibot.Page]) -> Iterator[pywikibot.Page]:
+    try:
+        # preloadpages обновляет переданные объекты страниц: page.text и последняя ревизия берутся из кэша
+        for _ in site.preloadpages(pages, groupsize=ARTICLE_PRELOAD_BATCH_SIZE):
+            pass
+    except pywikibot.exceptions.Error as e:
+        print(f"⚠️ Ошибка при предварительной загрузке статей: {e}")
+    yield from pages
+
+def prefetch_article_history(page: pywikibot.Page, search_mode: int) -> Union[List[Dict], RevisionStream]:
+    """
+    Загружает начало истории статьи, из которого берутся дата создания и количество ревизий
+    (выполняется и в фоновом потоке, поэтому ничего не выводит).
+    Бинарному поиску и галопу (режимы 3 и 4), а также для ограничения CONFIG['max_revisions']
+    нужны метаданные всей истории: они загружаются целиком, а в линейных режимах вместе с ними
+    в REVISION_STORE загружаются тексты первой порции ревизий в направлении поиска.
+    Иначе возвращается ленивая история (RevisionStream) в направлении поиска, у которой загружены
+    только первая порция метаданных и тексты первой порции ревизий: остальная история
+    запрашивается, лишь если поиск до неё дойдёт.
+    """
+    if search_mode not in (1, 2) or CONFIG.get('max_revisions', 0) > 0:
+        metadata = get_revision_metadata(page)
+        if REVISION_STORE is not None and search_mode in (1, 2):
+            first_batch = metadata[-REVISION_TEXT_BATCH_SIZE:] if search_mode == 1 else metadata[:REVISION_TEXT_BATCH_SIZE]
+            fetch_revision_texts(page.site, [rev['revid'] for rev in first_batch], REVISION_STORE)
+        return metadata
+    
+    revisions = RevisionStream(page, newest_first=(search_mode == 1))
+    revisions.prefetch(list(range(REVISION_TEXT_BATCH_SIZE)))
+    revisions.oldest_timestamp()
+    return revisions
+
+def get_history_summary(history: Union[List[Dict], RevisionStream]) -> Tuple[datetime, int, bool]:
+    """
+    Дата создания статьи и количество ревизий по загруженному началу истории (prefetch_article_history).
+    Третий элемент — True, если история загружена не полностью и количество ревизий — лишь число уже загруженных.
+    """
+    if isinstance(history, RevisionStream):
+        return history.oldest_timestamp() or datetime.now(), len(history), not history.is_complete
+    return (history[0]['timestamp'] if history else datetime.now()), len(history), False
+
+def iter_preloaded_articles(site: pywikibot.Site, category: pywikibot.Category,
+                            search_mode: int) -> Iterator[Tuple[pywikibot.Page, Union[List[Dict], RevisionStream]]]:
+    """
+    Перебирает статьи категории вместе с началом их истории (prefetch_article_history), из которого
+    берутся дата создания и количество ревизий и которое затем используется при поиске по истории.
+    Истории следующих CONFIG['prefetch_depth'] статей загружаются в фоновых потоках, пока
+    обрабатывается текущая; статьи возвращаются строго в порядке категории.
+    """
+    depth = CONFIG.get('prefetch_depth', 0)
+    if depth <= 0:
+        for page in iter_preloaded_pages(site, category):
+            yield page, prefetch_article_history(page, search_mode)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=depth)
+    pending = deque()
+    try:
+        for page in iter_preloaded_pages(site, category):
+            pending.append((page, executor.submit(prefetch_article_history, page, search_mode)))
+            if len(pending) > depth:
+                yield _take_prefetched(*pending.popleft(), search_mode)
+        while pending:
+            yield _take_prefetched(*pending.popleft(), search_mode)
+    finally:
+        # Обработка могла быть остановлена досрочно: незапущенные загрузки отменяем
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+def _take_prefetched(page: pywikibot.Page, future, search_mode: int) -> Tuple[pywikibot.Page, Union[List[Dict], RevisionStream]]:
+    try:
+        return page, future.result()
+    except pywikibot.exceptions.Error as e:
+        # Ошибку фоновой загрузки показываем в порядке статей и повторяем загрузку в основном потоке
+        print(f"⚠️ Ошибка при фоновой загрузке истории статьи: {e}")
+        return page, prefetch_article_history(page, search_mode)
 
-def get_revision_info(page: pywikibot.Page) -> Tuple[datetime, int, List[Dict]]:
+def get_revision_info(page: pywikibot.Page, search_mode: Optional[int] = None,
+                      revision_count: Optional[int] = None,
+                      metadata: Optional[Union[List[Dict], RevisionStream]] = None) -> Tuple[Optional[datetime], Optional[int], Union[List[Dict], RevisionStream]]:
+    """
+    Возвращает историю правок статьи.
+    Для линейных режимов поиска (1 и 2) история загружается лениво в направлении поиска
+    и прекращает загружаться, когда все искомые шаблоны найдены.
+    Для бинарного поиска и галопа (3 и 4) загружаются только метаданные, а тексты — по требованию.
+    Если метаданные истории уже загружены (metadata), повторно они не запрашиваются;
+    ленивая история из prefetch_article_history используется как есть.
+    """
     print(f"⏳ Начинаем обработку ревизий...")
-    revisions = []
-    for rev in page.revisions(content=True, reverse=True):
-        if not isinstance(rev, dict):
-            rev_dict = {
-                'revid': rev.revid,
-                'timestamp': rev.timestamp,
-                'text': rev.text
-            }
-            revisions.append(rev_dict)
+    if search_mode in (1, 2):
+        if isinstance(metadata, RevisionStream):
+            revisions = metadata
         else:
-            revisions.append(rev)
-            
+            revisions = RevisionStream(page, newest_first=(search_mode == 1), revision_count=revision_count,
+                                       metadata=metadata)
+        creation_date = revisions[0]['timestamp'] if search_mode == 2 and revisions else None
+        return creation_date, revision_count, revisions
+
+    if search_mode in (3, 4):
+        if metadata is None:
+            metadata = get_revision_metadata(page)
+        revisions = OnDemandRevisionList(page, list(metadata))
+        creation_date = metadata[0]['timestamp'] if metadata else datetime.now()
+        return creation_date, len(metadata), revisions
+
+    revisions = list(RevisionStream(page, newest_first=False))
     creation_date = revisions[0]['timestamp'] if revisions else datetime.now()
     revision_count = len(revisions)
     return creation_date, revision_count, revisions
 
+class DumpPage:
+    """
+    Статья из XML-дампа. Предоставляет то, что используется от pywikibot.Page при поиске
+    по истории: название, текущий текст и сайт (для запросов редиректов шаблонов).
+    """
+
+    def __init__(self, site: pywikibot.Site, title: str, text: str, latest_revid: int):
+        self.site = site
+        self._title = title
+        self.text = text
+        self.latest_revision_id = latest_revid
+
+    def title(self) -> str:
+        return self._title
+
+class DumpRevisionList(RevisionStream):
+    """
+    История правок статьи из XML-дампа. Метаданные всех ревизий находятся в памяти,
+    а тексты лежат во временном хранилище и читаются при каждом обращении, не накапливаясь
+    в памяти, поэтому даже статьи с очень длинной историей обрабатываются в ограниченной памяти.
+    """
+
+    def __init__(self, page: DumpPage, newest_first: bool, metadata: List[Dict], spool: RevisionStore):
+        super().__init__(page, newest_first, metadata=metadata)
+        self.spool = spool
+
+    def _load(self, indices: List[int]) -> List[Dict]:
+        revids = [self._revisions[i]['revid'] for i in indices]
+        texts = self.spool.get_many(revids)
+        self.fetched_texts += len(indices)
+        return [dict(self._revisions[i], text=texts.get(self._revisions[i]['revid'])) for i in indices]
+
+    def prefetch(self, indices: List[int]) -> None:
+        # Тексты читаются из временного хранилища при обращении, заранее загружать нечего
+        pass
+
+    def __getitem__(self, index: int) -> Dict:
+        if index < 0:
+            index += len(self._revisions)
+        if not self._available(index):
+            raise IndexError(index)
+        return self._load([index])[0]
+
+    def __iter__(self) -> Iterator[Dict]:
+        for start in range(0, len(self._revisions), REVISION_TEXT_BATCH_SIZE):
+            end = min(start + REVISION_TEXT_BATCH_SIZE, len(self._revisions))
+            yield from self._load(list(range(start, end)))
+
+    def __reversed__(self) -> Iterator[Dict]:
+        for end in range(len(self._revisions), 0, -REVISION_TEXT_BATCH_SIZE):
+            start = max(end - REVISION_TEXT_BATCH_SIZE, 0)
+            yield from reversed(self._load(list(range(start, end))))
+
+@contextmanager
+def open_dump_file(filename: str) -> Iterator:
+    """
+    Открывает XML-дамп как двоичный поток; сжатые дампы распаковываются на лету.
+    Для .7z после чтения дожидается завершения утилиты 7z: если она завершилась с ошибкой,
+    поток мог оборваться раньше конца дампа, поэтому выбрасывается RuntimeError.
+    """
+    if filename.endswith('.bz2'):
+        dump = bz2.open(filename, 'rb')
+    elif filename.endswith('.gz'):
+        dump = gzip.open(filename, 'rb')
+    elif filename.endswith('.7z'):
+        # Для .7z нужна утилита 7z: она распаковывает дамп в stdout
+        process = subprocess.Popen(['7z', 'e', '-so', filename],
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            yield process.stdout
+        except BaseException:
+            # Чтение прервано: 7z больше не нужна
+            process.kill()
+            raise
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+        if returncode != 0:
+            raise RuntimeError(f"7z завершилась с кодом {returncode}: дамп {filename} прочитан не полностью")
+        return
+    else:
+        dump = open(filename, 'rb')
+    with dump:
+        yield dump
+
+def iter_dump_pages(filename: str, spool: RevisionStore) -> Iterator[Tuple[str, List[Dict], str]]:
+    """
+    Потоково читает XML-дамп pages-meta-history и возвращает статьи основного пространства
+    (без перенаправлений) в виде кортежей (название, метаданные ревизий от старых к новым, текущий текст).
+    Тексты ревизий текущей статьи складываются во временное хранилище spool, которое
+    очищается перед следующей статьёй, так что в памяти находятся только метаданные одной статьи.
+    """
+    with open_dump_file(filename) as dump:
+        root, page_element = None, None
+        title, namespace, is_redirect = None, None, False
+        metadata, pending_texts, latest_key, latest_text = [], {}, None, None
+        revision, in_contributor = None, False
+
+        for event, element in ElementTree.iterparse(dump, events=('start', 'end')):
+            tag = element.tag.rsplit('}', 1)[-1]  # Убираем пространство имён схемы экспорта
+
+            if event == 'start':
+                if root is None:
+                    root = element
+                elif tag == 'page':
+                    page_element = element
+                    title, namespace, is_redirect = None, None, False
+                    metadata, pending_texts, latest_key, latest_text = [], {}, None, None
+                    spool.clear()
+                elif tag == 'revision':
+                    revision = {}
+                elif tag == 'contributor':
+                    in_contributor = True
+                continue
+
+            if tag == 'contributor':
+                in_contributor = False
+            elif revision is not None and not in_contributor:
+                if tag == 'id':
+                    revision['revid'] = int(element.text)
+                elif tag == 'timestamp':
+                    revision['timestamp'] = pywikibot.Timestamp.fromISOformat(element.text)
+                elif tag == 'sha1' and element.text:
+                    revision['sha1'] = element.text
+                elif tag == 'text':
+                    # Скрытый текст ревизии в дампе помечен атрибутом deleted
+                    revision['text'] = None if element.get('deleted') else (element.text or '')
+                    if element.get('bytes'):
+                        revision['size'] = int(element.get('bytes'))
+                elif tag == 'revision':
+                    text = revision.pop('text', None)
+                    pending_texts[revision['revid']] = text
+                    if latest_key is None or (revision['timestamp'], revision['revid']) > latest_key:
+                        latest_key, latest_text = (revision['timestamp'], revision['revid']), text
+                    metadata.append(revision)
+                    revision = None
+                    if len(pending_texts) >= REVISION_TEXT_BATCH_SIZE:
+                        spool.put_many(pending_texts)
+                        pending_texts = {}
+                    # Разобранная ревизия больше не нужна
+                    page_element.remove(element)
+            elif page_element is not None:
+                if tag == 'title':
+                    title = element.text
+                elif tag == 'ns':
+                    namespace = element.text
+                elif tag == 'redirect':
+                    is_redirect = True
+                elif tag == 'page':
+                    spool.put_many(pending_texts)
+                    root.remove(page_element)
+                    page_element = None
+                    if namespace == '0' and not is_redirect and metadata and latest_text is not None:
+                        metadata.sort(key=lambda rev: (rev['timestamp'], rev['revid']))
+                        yield title, metadata, latest_text
+
 def get_normalized_section_name(section_name: str) -> str:
     """
     Нормализует название раздела, удаляя общие вариации, лишние пробелы и вики-разметку
@@ -211,137 +725,98 @@ def compare_template_names(name1: str, name2: str) -> bool:
     - The rest of the name is case-sensitive.
     - Spaces and underscores are treated as equivalent and normalized to a single space.
     """
-    n1 = ' '.join(name1.replace('_', ' ').split())
-    n2 = ' '.join(name2.replace('_', ' ').split())
-
-    if not n1 or not n2:
-        return n1 == n2
-
-    if n1[0].lower() != n2[0].lower():
-        return False
+    return canonical_template_name(name1) == canonical_template_name(name2)
 
-    if n1[1:] != n2[1:]:
-        return False
-
-    return True
+def canonical_template_name(name: str) -> str:
+    """
+    Приводит название шаблона к каноническому ключу по правилам ссылок MediaWiki:
+    подчёркивания и пробельные символы схлопываются в один пробел, первая буква — строчная.
+    Названия совпадают по compare_template_names тогда и только тогда, когда совпадают их ключи,
+    поэтому поиск варианта по ключу в словаре заменяет перебор с попарным сравнением.
+    """
+    name = ' '.join(name.replace('_', ' ').split())
+    return name[:1].lower() + name[1:]
 
 def find_sections(wikitext: str) -> List[Tuple[str, int, int]]:
     """
     Находит все разделы и их позиции в тексте.
     Возвращает список кортежей (название_раздела, начальная_позиция, конечная_позиция).
     Вводный раздел (до первого заголовка) определяется как "Вводный раздел".
+    Заголовок — строка, которая после удаления пробелов начинается и заканчивается на "==";
+    раздел начинается с конца строки заголовка и продолжается до следующего заголовка.
+    Текст просматривается за один проход.
     """
     sections = []
-    current_pos = 0
     
-    # Сначала найдем первый заголовок, чтобы определить вводный раздел
-    first_section_pos = -1
-    for level in range(2, 7):
-        equals = "=" * level
-        section_start = wikitext.find(f"\n{equals}")
-        if section_start != -1 and (first_section_pos == -1 or section_start < first_section_pos):
-            first_section_pos = section_start
-    
-    # Если есть текст до первого заголовка, добавляем его как вводный раздел
+    # Вводный раздел заканчивается на первой строке, начинающейся с "=="
+    first_section_pos = wikitext.find("\n==")
     if first_section_pos > 0:
         sections.append(("Вводный раздел", 0, first_section_pos))
     elif first_section_pos == -1:  # Если заголовков нет вообще
         sections.append(("Вводный раздел", 0, len(wikitext)))
         return sections
     
-    # Теперь найдем все остальные разделы
-    while True:
-        next_section = -1
-        min_level = 99
-        pos = -1
-        
-        for level in range(2, 7):
-            equals = "=" * level
-            # section_pattern = f"\n[ ]*{equals}[ ]*" # Удалено, т.к. переменная не используется
-            section_start = wikitext.find("\n", current_pos)
-            
-            while section_start != -1:
-                line_start = section_start + 1
-                line_end = wikitext.find("\n", line_start)
-                if line_end == -1:
-                    line_end = len(wikitext)
-                
-                line = wikitext[line_start:line_end].strip()
-                
-                # Проверяем, начинается и заканчивается ли строка одинаковым количеством знаков равенства
-                if line.startswith(equals) and line.endswith(equals):
-                    if pos == -1 or section_start < pos:
-                        pos = section_start
-                        next_section = section_start
-                        min_level = level
-                        break
-                
-                section_start = wikitext.find("\n", section_start + 1)
-        
-        if next_section == -1:
-            break
-            
-        section_end = wikitext.find("\n", next_section + 1)
-        if section_end == -1:
-            section_end = len(wikitext)
-        
+    # Позиции переводов строк перед заголовками и концы строк заголовков
+    headings = []
+    for match in SECTION_HEADING_CANDIDATE.finditer(wikitext):
+        if match.group().strip().endswith("=="):
+            headings.append((match.start(), match.end()))
+    
+    for i, (heading_start, heading_end) in enumerate(headings):
         # Извлекаем и очищаем название раздела
-        section_text = wikitext[next_section:section_end]
-        section_name = section_text.strip("= \n")
-        
-        next_section_start = -1
-        for level in range(2, 7):
-            pattern = f"\n[ ]*{'=' * level} "
-            pos = wikitext.find("\n", section_end)
-            while pos != -1:
-                line_start = pos + 1
-                line_end = wikitext.find("\n", line_start)
-                if line_end == -1:
-                    line_end = len(wikitext)
-                
-                line = wikitext[line_start:line_end].strip()
-                if line.startswith('=' * level) and line.endswith('=' * level):
-                    if next_section_start == -1 or pos < next_section_start:
-                        next_section_start = pos
-                        break
-                
-                pos = wikitext.find("\n", pos + 1)
-        
-        if next_section_start == -1:
-            next_section_start = len(wikitext)
-            
-        sections.append((section_name, section_end, next_section_start))
-        current_pos = section_end
+        section_name = wikitext[heading_start:heading_end].strip("= \n")
+        next_section_start = headings[i + 1][0] if i + 1 < len(headings) else len(wikitext)
+        sections.append((section_name, heading_end, next_section_start))
     
     return sections
 
+def index_template_positions(wikicode: mwparserfromhell.wikicode.Wikicode) -> Dict[str, List[int]]:
+    """
+    Один раз для разобранного текста вычисляет позиции всех шаблонов в исходном тексте,
+    включая вложенные (шаблоны внутри комментариев не учитываются — парсер их не разбирает).
+    Возвращает словарь {текст_шаблона: [позиции всех шаблонов с таким текстом]}.
+    """
+    positions = {}
+    _collect_template_positions(wikicode, 0, positions)
+    return positions
+
+def _collect_template_positions(code: mwparserfromhell.wikicode.Wikicode, offset: int,
+                                positions: Dict[str, List[int]]) -> None:
+    for node in code.nodes:
+        node_str = str(node)
+        # Узлы без "{{" не могут содержать шаблонов
+        if '{{' in node_str:
+            if isinstance(node, mwparserfromhell.nodes.Template):
+                positions.setdefault(node_str, []).append(offset)
+            # Дочерние фрагменты узла (название и параметры шаблона, содержимое тега и т. п.)
+            # идут в тексте узла по порядку, поэтому каждый ищется после предыдущего
+            cursor = 0
+            for child in node.__children__():
+                child_str = str(child)
+                child_pos = node_str.find(child_str, cursor)
+                if child_pos == -1:
+                    continue
+                if '{{' in child_str:
+                    _collect_template_positions(child, offset + child_pos, positions)
+                cursor = child_pos + len(child_str)
+        offset += len(node_str)
+
 def get_section_for_template(wikicode: mwparserfromhell.wikicode.Wikicode, 
                            template: mwparserfromhell.nodes.Template,
-                           sections: List[Tuple[str, int, int]]) -> List[str]:
+                           sections: List[Tuple[str, int, int]],
+                           template_positions: Optional[Dict[str, List[int]]] = None) -> List[str]:
     """
-    Определяет, к каким разделам принадлежит шаблон.
+    Определяет, к каким разделам принадлежит шаблон (учитываются все шаблоны с таким же текстом).
     Возвращает список названий разделов.
+    Позиции шаблонов (index_template_positions) лучше вычислить один раз для текста и передать
+    в template_positions; раздел по позиции находится двоичным поиском по началам разделов.
     """
     found_sections = []
     try:
-        template_str = str(template)
-        full_text = str(wikicode)
-        start = 0
-        found_positions = []
-        
-        # Находим все позиции шаблона в тексте
-        while True:
-            pos = full_text.find(template_str, start)
-            if pos == -1:
-                break
-            found_positions.append(pos)
-            start = pos + len(template_str)  # Изменено: ищем следующее вхождение после конца текущего
-        
-        # Для каждой найденной позиции определяем раздел
-        for pos in found_positions:
-            for section_name, start_pos, end_pos in sections:
-                if start_pos <= pos < end_pos and section_name not in found_sections:
-                    found_sections.append(section_name)
+        if template_positions is None:
+            template_positions = index_template_positions(wikicode)
+        found_positions = template_positions.get(str(template), [])
+        found_sections = get_sections_at_positions(found_positions, sections)
         
         if found_positions and not found_sections:
             print_debug(f"      ℹ️ Шаблон статьи найден на позиции {found_positions[0]}")
@@ -352,19 +827,159 @@ def get_section_for_template(wikicode: mwparserfromhell.wikicode.Wikicode,
     
     return found_sections
 
-def get_section_template_text(sections: List[Tuple[str, int, int]], 
-                            wikicode: mwparserfromhell.wikicode.Wikicode,
-                            full_text: str,
-                            normalized_target: str) -> Optional[str]:
-    """Получает текст шаблона из целевого раздела с учетом вариаций названия раздела"""
-    for section_name, start, end in sections:
-        if get_normalized_section_name(section_name) == normalized_target:
-            section_text = full_text[start:end]
-            return section_text
-    return None
+def get_sections_at_positions(positions: List[int], sections: List[Tuple[str, int, int]]) -> List[str]:
+    """
+    Возвращает названия разделов, в которые попадают позиции positions (без повторов, в порядке позиций).
+    Раздел по позиции находится двоичным поиском по началам разделов.
+    """
+    found_sections = []
+    section_starts = [start_pos for _, start_pos, _ in sections]
+    for pos in positions:
+        section_index = bisect.bisect_right(section_starts, pos) - 1
+        if section_index < 0:
+            continue
+        section_name, start_pos, end_pos = sections[section_index]
+        if pos < end_pos and section_name not in found_sections:
+            found_sections.append(section_name)
+    return found_sections
+
+class ParsedTemplate:
+    """
+    Шаблон из разобранного текста ревизии: название и параметры [(название, значение)]
+    без пробелов по краям, позиция в тексте (None, если её не удалось определить), длина
+    и разделы, в которых встречаются шаблоны с таким же текстом (как в get_section_for_template).
+    """
+
+    def __init__(self, name: str, params: List[Tuple[str, str]], offset: Optional[int], length: int):
+        self.name = name
+        self.params = params
+        self.offset = offset
+        self.length = length
+        self.sections: List[str] = []
+
+class ParsedRevision:
+    """
+    Результат единственного разбора текста ревизии, общий для всех проверок:
+    все шаблоны текста, включая вложенные, в порядке filter_templates(), и разделы (find_sections).
+    Дерево разбора не хранится — только эти сведения, поэтому их можно держать в кэше.
+    """
+
+    def __init__(self, text: str):
+        self.sections = find_sections(text)
+        self.templates: List[ParsedTemplate] = []
+        template_texts: List[str] = []
+        _collect_parsed_templates(mwparserfromhell.parse(text), self.templates, template_texts)
+        positions: Dict[str, List[int]] = {}
+        for template, template_str in zip(self.templates, template_texts):
+            if template.offset is not None:
+                positions.setdefault(template_str, []).append(template.offset)
+        for template, template_str in zip(self.templates, template_texts):
+            template.sections = get_sections_at_positions(positions.get(template_str, []), self.sections)
+        # Приблизительный объём в памяти (для ограничения размера кэша)
+        self.size = 200 + sum(100 + len(name) * 2 for name, _, _ in self.sections) + sum(
+            200 + 2 * (len(template.name) + sum(len(name) + len(value) for name, value in template.params))
+            for template in self.templates)
 
+    def template_extents(self) -> List[Tuple[int, int]]:
+        """Границы (начало, конец) всех шаблонов текста с известной позицией, по возрастанию"""
+        return sorted((template.offset, template.offset + template.length)
+                      for template in self.templates if template.offset is not None)
+
+def _collect_parsed_templates(code: mwparserfromhell.wikicode.Wikicode, templates: List[ParsedTemplate],
+                              template_texts: List[str]) -> str:
+    """
+    Добавляет в templates шаблоны фрагмента в том же порядке, что и filter_templates(): узел,
+    затем его дочерние фрагменты. Позиции вычисляются так же, как в _collect_template_positions,
+    но относительно начала фрагмента; если дочерний фрагмент не найден в тексте узла, шаблоны
+    внутри него остаются без позиции. Возвращает текст фрагмента: он собирается из уже полученных
+    текстов узлов, поэтому каждый уровень вложенности переводится в строку один раз.
+    """
+    node_strs = []
+    offset = 0
+    for node in code.nodes:
+        node_str = str(node)
+        # Узлы без "{{" не могут содержать шаблонов
+        if '{{' in node_str:
+            template = None
+            if isinstance(node, mwparserfromhell.nodes.Template):
+                # Запись добавляется до вложенных шаблонов, название и параметры заполняются после обхода
+                template = ParsedTemplate('', [], offset, len(node_str))
+                templates.append(template)
+                template_texts.append(node_str)
+            cursor = 0
+            child_strs = []
+            for child in node.__children__():
+                first_nested = len(templates)
+                child_str = _collect_parsed_templates(child, templates, template_texts)
+                child_strs.append(child_str)
+                child_pos = node_str.find(child_str, cursor)
+                for nested in templates[first_nested:]:
+                    if nested.offset is not None:
+                        nested.offset = offset + child_pos + nested.offset if child_pos != -1 else None
+                if child_pos != -1:
+                    cursor = child_pos + len(child_str)
+            if template is not None:
+                # Дочерние фрагменты шаблона — название, затем название (если указано явно) и значение
+                # каждого параметра, так что их тексты, уже полученные при обходе, заново не собираются
+                template.name = child_strs[0].strip()
+                child_index = 1
+                for param in node.params:
+                    if param.showkey:
+                        param_name = child_strs[child_index]
+                        child_index += 1
+                    else:
+                        param_name = str(param.name)
+                    template.params.append((param_name.strip(), child_strs[child_index].strip()))
+                    child_index += 1
+        node_strs.append(node_str)
+        offset += len(node_str)
+    return ''.join(node_strs)
+
+class RevisionParseCache:
+    """
+    Кэш разбора ревизий текущей статьи (ParsedRevision) с вытеснением давно не использованных записей.
+    Ключ — sha1 ревизии, а если его нет — revid, поэтому одинаковые тексты (откаты) разбираются один раз.
+    Поиск шаблонов, параметров Rq и разделов по одной и той же ревизии использует один разбор.
+    Суммарный приблизительный объём записей не превышает max_bytes; при переходе к следующей статье
+    кэш очищается (start_article), а счётчики попаданий и промахов накапливаются за весь запуск.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def start_article(self) -> None:
+        self._entries.clear()
+        self._size = 0
+
+    def get(self, rev: Dict) -> Optional[ParsedRevision]:
+        """Возвращает разбор текста ревизии (None для ревизии без текста)"""
+        if rev.get('text') is None:
+            return None
+        key = rev.get('sha1') or rev.get('revid')
+        if key is not None and key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        self.misses += 1
+        parsed = ParsedRevision(rev['text'])
+        if key is not None and parsed.size <= self.max_bytes:
+            self._entries[key] = parsed
+            self._size += parsed.size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+        return parsed
+
+# Кэш разбора ревизий текущей статьи
+REVISION_PARSE_CACHE = RevisionParseCache(CONFIG.get('parse_cache_mb', 64) * 1024 * 1024)
+
+@lru_cache(maxsize=SECTION_NAME_CACHE_SIZE)
 def normalize_section_name(name: str) -> str:
-    """Нормализует название раздела для сравнения"""
+    """Нормализует название раздела для сравнения (результат кэшируется для каждого названия)"""
     # Удаляем спецсимволы
     for char in '«»""\'\'[]()„"':
         name = name.replace(char, '')
@@ -385,9 +1000,16 @@ def sections_are_similar(name1: str, name2: str) -> bool:
     if any(x in (name1, name2) for x in ('".', '"', ".", "предыстория")):
         return False
         
-    name1 = normalize_section_name(name1)
-    name2 = normalize_section_name(name2)
-    
+    return normalized_sections_are_similar(normalize_section_name(name1), normalize_section_name(name2))
+
+@lru_cache(maxsize=SECTION_SIMILARITY_CACHE_SIZE)
+def normalized_sections_are_similar(name1: str, name2: str) -> bool:
+    """
+    Сравнивает нормализованные названия разделов (результат кэшируется для каждой пары).
+    Перед полным SequenceMatcher.ratio() проверяются дешёвые верхние оценки сходства
+    (real_quick_ratio по длинам и quick_ratio по составу символов): если уже они ниже порога,
+    полное сравнение не нужно, и результат от этого не меняется.
+    """
     # Если названия пустые после нормализации - не сравниваем
     if not name1 or not name2:
         return False
@@ -395,10 +1017,15 @@ def sections_are_similar(name1: str, name2: str) -> bool:
     if name1 == name2:
         return True
     
+    if len(name1) < 5 or len(name2) < 4:
+        return False
+    
     # Используем SequenceMatcher для сравнения строк
-    similarity = SequenceMatcher(None, name1, name2).ratio()
+    matcher = SequenceMatcher(None, name1, name2)
+    if matcher.real_quick_ratio() < 0.70 or matcher.quick_ratio() < 0.70:
+        return False
     
-    return len(name1) >= 5 and len(name2) >= 4 and similarity >= 0.70
+    return matcher.ratio() >= 0.70
 
 def get_section_history(page: pywikibot.Page, current_section_name: str) -> List[str]:
     """
@@ -408,7 +1035,7 @@ def get_section_history(page: pywikibot.Page, current_section_name: str) -> List
     section_names = [current_section_name]
     
     try:
-        for rev in page.revisions(content=True, reverse=True):
+        for rev in RevisionStream(page, newest_first=False):
             if 'text' not in rev or rev['text'] is None:
                 continue
                 
@@ -447,7 +1074,7 @@ def find_first_template_addition_in_section(page: pywikibot.Page,
         # Вместо отслеживания каждого раздела отдельно, отслеживаем общее присутствие
         previous_templates = set()
         
-        for rev in page.revisions(content=True, reverse=True):
+        for rev in RevisionStream(page, newest_first=False):
             timestamp = rev['timestamp']
             if timestamp > cutoff_date:
                 continue
@@ -455,17 +1082,19 @@ def find_first_template_addition_in_section(page: pywikibot.Page,
             if 'text' not in rev or rev['text'] is None:
                 continue
                 
-            current_text = rev['text']
-            wikicode = mwparserfromhell.parse(current_text)
-            sections = find_sections(current_text)
+            # Один разбор ревизии: шаблоны раздела выбираются по позициям, а не разбором текста раздела
+            parsed = REVISION_PARSE_CACHE.get(rev)
             
             # Получаем все шаблоны из всех исторических названий раздела в этой ревизии
             current_templates = set()
             for normalized_target in normalized_targets:
-                section_text = get_section_template_text(sections, wikicode, current_text, normalized_target)
-                if section_text:
-                    for template in mwparserfromhell.parse(section_text).filter_templates():
-                        template_name = str(template.name).strip().lower()
+                section_bounds = next(((start, end) for section_name, start, end in parsed.sections
+                                       if get_normalized_section_name(section_name) == normalized_target), None)
+                if section_bounds and section_bounds[0] < section_bounds[1]:
+                    for template in parsed.templates:
+                        if template.offset is None or not section_bounds[0] <= template.offset < section_bounds[1]:
+                            continue
+                        template_name = template.name.lower()
                         for templates in template_redirects.values():
                             for redirect_name, main_name in templates.items():
                                 if template_name == redirect_name.lower():
@@ -477,12 +1106,11 @@ def find_first_template_addition_in_section(page: pywikibot.Page,
                 template_name, main_name = next(iter(current_templates))
                 
                 existing_date = None
-                for template in wikicode.filter_templates():
-                    if str(template.name).strip().lower() == template_name:
-                        for param in template.params:
-                            param_name = str(param.name).strip().lower()
-                            if param_name in ['date', 'дата']:
-                                existing_date = str(param.value).strip()
+                for template in parsed.templates:
+                    if template.name.lower() == template_name:
+                        for param_name, param_value in template.params:
+                            if param_name.lower() in ['date', 'дата']:
+                                existing_date = param_value
                                 break
                         if existing_date:
                             break
@@ -750,6 +1378,34 @@ def update_template_with_date_and_name(text: str, found_template: str, main_temp
     result = re.sub(pattern, process_template, text, flags=re.IGNORECASE)
     return result
 
+def get_category_sizes(site: pywikibot.Site, category_names: List[str]) -> Dict[str, int]:
+    """
+    Получает количество страниц в категориях через prop=categoryinfo, по 50 категорий за запрос,
+    без перебора участников категорий.
+    
+    Returns:
+        Dict[str, int]: Словарь {название_категории: количество_страниц}
+    """
+    sizes = {}
+    for i in range(0, len(category_names), 50):
+        batch = category_names[i:i + 50]
+        parameters = {
+            'action': 'query',
+            'prop': 'categoryinfo',
+            'titles': '|'.join(batch),
+            'formatversion': 2,
+        }
+        data = api.Request(site=site, parameters=parameters).submit()
+        for page_data in data.get('query', {}).get('pages', []):
+            # Подкатегории и файлы не учитываются, как и в Category.articles()
+            sizes[page_data['title']] = page_data.get('categoryinfo', {}).get('pages', 0)
+    return sizes
+
+def get_category_size(site: pywikibot.Site, category_name: str) -> int:
+    """Возвращает количество страниц в одной категории"""
+    title = pywikibot.Category(site, category_name).title()
+    return get_category_sizes(site, [title]).get(title, 0)
+
 def get_active_subcategories(site: pywikibot.Site, parent_category_name: str) -> List[Tuple[str, int]]:
     """
     Получает список существующих подкатегорий с количеством статей, отсортированный по возрастанию.
@@ -761,10 +1417,12 @@ def get_active_subcategories(site: pywikibot.Site, parent_category_name: str) ->
     parent_category = pywikibot.Category(site, parent_category_name)
     
     try:
-        for subcategory in parent_category.subcategories():
-            article_count = len(list(subcategory.articles()))
+        subcategory_names = [subcategory.title() for subcategory in parent_category.subcategories()]
+        sizes = get_category_sizes(site, subcategory_names)
+        for subcategory_name in subcategory_names:
+            article_count = sizes.get(subcategory_name, 0)
             if article_count > 0:
-                active_categories.append((subcategory.title(), article_count))
+                active_categories.append((subcategory_name, article_count))
                 
         # Сортируем по количеству статей
         active_categories.sort(key=lambda x: x[1])
@@ -846,13 +1504,15 @@ def cache_template_info(template_redirects: Dict[str, Dict[str, str]]) -> Dict[s
         Dict[str, Dict[str, str]]: {
             'normalized_variants': {нормализованное_имя: основное_имя},
             'original_names': {нормализованное_имя: оригинальное_имя},
-            'all_variants': {вариант_имени: (основное_имя, оригинальное_имя)}
+            'all_variants': {вариант_имени: (основное_имя, оригинальное_имя)},
+            'canonical_variants': {канонический_ключ: (основное_имя, оригинальное_имя)}
         }
     """
     template_info = {
         'normalized_variants': {},  # нормализованное -> основное_имя
         'original_names': {},       # нормализованное -> оригинальное_имя
-        'all_variants': {}          # любой вариант -> (основное_имя, оригинальное_имя)
+        'all_variants': {},         # любой вариант -> (основное_имя, оригинальное_имя)
+        'canonical_variants': {}    # канонический ключ (canonical_template_name) -> (основное_имя, оригинальное_имя)
     }
     
     for templates in template_redirects.values():
@@ -878,6 +1538,10 @@ def cache_template_info(template_redirects: Dict[str, Dict[str, str]]) -> Dict[s
             for variant in variants:
                 template_info['all_variants'][variant] = (main_name, original_name)
     
+    # Если несколько вариантов дают один ключ, выигрывает первый — как при переборе all_variants
+    for variant, variant_value in template_info['all_variants'].items():
+        template_info['canonical_variants'].setdefault(canonical_template_name(variant), variant_value)
+    
     return template_info
 
 def clean_section_name(name: str) -> str:
@@ -908,19 +1572,25 @@ def normalize_template_name(name: str) -> str:
     name = ' '.join(name.split())
     return name
 
-def has_section_parameter(template: mwparserfromhell.nodes.Template) -> bool:
+def iter_template_params(template: Union[mwparserfromhell.nodes.Template, ParsedTemplate]) -> Iterator[Tuple[str, str]]:
+    """Перебирает пары (название, значение) параметров шаблона без пробелов по краям"""
+    if isinstance(template, ParsedTemplate):
+        return iter(template.params)
+    return ((str(param.name).strip(), str(param.value).strip()) for param in template.params)
+
+def has_section_parameter(template: Union[mwparserfromhell.nodes.Template, ParsedTemplate]) -> bool:
     """
     Проверяет, содержат ли параметры шаблона слово "раздел".
     
     Args:
-        template: Объект шаблона
+        template: Объект шаблона (или шаблон из ParsedRevision)
     
     Returns:
         bool: True, если в параметрах шаблона есть слово "раздел"
     """
-    for param in template.params:
-        param_name = str(param.name).strip().lower()
-        param_value = str(param.value).strip().lower()
+    for param_name, param_value in iter_template_params(template):
+        param_name = param_name.lower()
+        param_value = param_value.lower()
         
         # Проверяем, если параметр имеет название "раздел" или его значение содержит это слово
         if "раздел" in param_name or "раздел" in param_value:
@@ -928,6 +1598,52 @@ def has_section_parameter(template: mwparserfromhell.nodes.Template) -> bool:
     
     return False
 
+def get_template_prefilter(templates_to_find: List[Tuple[str, Optional[str], Dict[str, str]]]) -> re.Pattern:
+    """
+    Возвращает скомпилированное регулярное выражение, находящее в сыром тексте любое из названий
+    шаблонов из templates_to_find (без учёта регистра, пробелы и подчёркивания между словами — любые).
+    Выражение находит всё, что совпало бы по compare_template_names, поэтому ревизия без совпадений
+    заведомо не содержит искомых шаблонов. Выражения кэшируются по набору названий.
+    """
+    variants = frozenset(variant for _, _, template_variants in templates_to_find for variant in template_variants)
+    pattern = TEMPLATE_PREFILTER_CACHE.get(variants)
+    if pattern is None:
+        alternatives = []
+        for variant in sorted(variants):
+            words = variant.replace('_', ' ').split()
+            if words:
+                alternatives.append(r'[\s_]+'.join(re.escape(word) for word in words))
+        # Без названий выражение не должно ничего находить
+        pattern = re.compile('|'.join(alternatives) if alternatives else r'(?!)', re.IGNORECASE)
+        TEMPLATE_PREFILTER_CACHE[variants] = pattern
+    return pattern
+
+def split_template_key(template_key: str) -> Tuple[str, Optional[str]]:
+    """
+    Разбирает ключ результата поиска шаблонов ("название_раздел" или "название_None")
+    на кортеж (название, раздел или None).
+    """
+    template_name, _, section_name = template_key.partition('_')
+    return template_name, section_name if section_name and section_name != 'None' else None
+
+def get_variant_matcher(templates_to_find: List[Tuple[str, Optional[str], Dict[str, str]]]) -> Dict[str, List[int]]:
+    """
+    Возвращает словарь {канонический_ключ_названия: [индексы записей templates_to_find]}:
+    по названию шаблона из текста сразу находятся все записи, в вариантах которых оно есть
+    (в исходном порядке записей). Словари кэшируются по содержимому templates_to_find.
+    """
+    cache_key = tuple((t_name, section_name, frozenset(variants)) for t_name, section_name, variants in templates_to_find)
+    matcher = TEMPLATE_MATCHER_CACHE.get(cache_key)
+    if matcher is None:
+        matcher = {}
+        for entry_index, (_, _, variants) in enumerate(templates_to_find):
+            for variant in variants:
+                entries = matcher.setdefault(canonical_template_name(variant), [])
+                if entry_index not in entries:
+                    entries.append(entry_index)
+        TEMPLATE_MATCHER_CACHE[cache_key] = matcher
+    return matcher
+
 def check_templates_in_revision(rev: Dict, templates_to_find: List[Tuple[str, Optional[str], Dict[str, str]]]) -> Dict[str, Tuple[datetime, str, Optional[str], str]]:
     """
     Проверяет наличие шаблонов в конкретной ревизии.
@@ -939,36 +1655,51 @@ def check_templates_in_revision(rev: Dict, templates_to_find: List[Tuple[str, Op
     Returns:
         Dict[str, Tuple[datetime, str, Optional[str], str]]: Словарь {ключ_шаблона: (timestamp, revid, section_name, variant_found)}
     """
+    return analyze_revision_templates(rev, templates_to_find)[0]
+
+def analyze_revision_templates(rev: Dict, templates_to_find: List[Tuple[str, Optional[str], Dict[str, str]]],
+                               with_extents: bool = False, with_sections: bool = False
+                               ) -> Tuple[Dict[str, Tuple[datetime, str, Optional[str], str]], Optional[List[Tuple[int, int]]], Optional[List[str]]]:
+    """
+    Выполняет проверку check_templates_in_revision. Если with_extents=True и текст был разобран,
+    дополнительно возвращает границы (начало, конец) всех шаблонов текста — по ним
+    IncrementalTemplateScanner определяет, затронула ли следующая правка какой-либо шаблон.
+    Для неразобранного текста (нет текста или нет ни одного искомого названия) границы равны None.
+    Если with_sections=True, возвращает и названия разделов ревизии (из того же разбора ParsedRevision,
+    что и для поиска шаблонов), чтобы история разделов собиралась в том же проходе.
+    Разбор текста берётся из REVISION_PARSE_CACHE.
+    """
     if 'text' not in rev or rev['text'] is None:
-        return {}
+        return {}, None, None
         
     results = {}
     text = rev['text']
-    wikicode = mwparserfromhell.parse(text)
-    sections = find_sections(text)
+    
+    # Быстрая отбраковка: если в тексте нет ни одного из искомых названий, полный разбор не нужен
+    if not get_template_prefilter(templates_to_find).search(text):
+        return results, None, [name for name, _, _ in find_sections(text)] if with_sections else None
+    
+    variant_matcher = get_variant_matcher(templates_to_find)
+    parsed = REVISION_PARSE_CACHE.get(rev)
+    section_names = [name for name, _, _ in parsed.sections] if with_sections else None
     
     # Проверяем каждый шаблон
-    for template in wikicode.filter_templates():
-        template_name = str(template.name).strip()
+    for template in parsed.templates:
+        template_name = template.name
         
-        # Проверяем, есть ли этот шаблон среди искомых
-        for t_name, section_name, variants in templates_to_find:
+        # Проверяем, есть ли этот шаблон среди искомых (по каноническому ключу названия)
+        for entry_index in variant_matcher.get(canonical_template_name(template_name), ()):
+            t_name, section_name, variants = templates_to_find[entry_index]
             # t_name здесь - это нормализованное имя основного шаблона
             # section_name - либо имя раздела, либо None
             template_key = f"{t_name}_{section_name}" if section_name is not None else f"{t_name}_None"
             
-            # Проверяем совпадение нормализованных имен с вариантами
-            found_variant_match = None # Store the actual variant that matched
-            for variant_in_dict in variants: # variant_in_dict is an alias or main name from the redirects dict
-                if compare_template_names(template_name, variant_in_dict):
-                    found_variant_match = template_name # Store the name as it appears in the text
-                    break
+            found_variant_match = template_name # Store the name as it appears in the text
 
             if found_variant_match:
                 if section_name:
                     # Для шаблонов разделов проверяем, в правильном ли разделе находится шаблон
-                    template_sections = get_section_for_template(wikicode, template, sections)
-                    for found_section in template_sections:
+                    for found_section in template.sections:
                         if sections_are_similar(found_section, section_name):
                             results[template_key] = (rev['timestamp'], str(rev['revid']), found_section, found_variant_match)
                             break
@@ -978,10 +1709,9 @@ def check_templates_in_revision(rev: Dict, templates_to_find: List[Tuple[str, Op
                     
                     if has_section_param_flag:
                         # Если шаблон содержит параметр "раздел", ищем раздел, в котором он находится
-                        template_sections = get_section_for_template(wikicode, template, sections)
-                        if template_sections:
+                        if template.sections:
                             # Используем первый найденный раздел
-                            found_section = template_sections[0]
+                            found_section = template.sections[0]
                             # Создаем новый ключ с найденным разделом
                             # section_key = f"{t_name}_{normalize_template_name(found_section)}"
                             # Используем оригинальный t_name и found_section для ключа, 
@@ -995,7 +1725,341 @@ def check_templates_in_revision(rev: Dict, templates_to_find: List[Tuple[str, Op
                         # template_key уже будет t_name_None
                         results[template_key] = (rev['timestamp'], str(rev['revid']), None, found_variant_match)
     
-    return results
+    if not with_extents:
+        return results, None, section_names
+    return results, parsed.template_extents(), section_names
+
+def common_prefix_length(text1: str, text2: str) -> int:
+    """Длина общего начала двух строк (двоичный поиск по сравнениям срезов)"""
+    low, high = 0, min(len(text1), len(text2))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if text1[:middle] == text2[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def common_suffix_length(text1: str, text2: str, limit: int) -> int:
+    """Длина общего конца двух строк, не больше limit"""
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if text1[len(text1) - middle:] == text2[len(text2) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def revision_content_hash(rev: Dict) -> Optional[str]:
+    """
+    Хэш содержимого ревизии: sha1 из метаданных (запрашивается вместе с историей),
+    а если его нет — sha1 текста. Для ревизии без sha1 и без текста возвращает None.
+    """
+    if rev.get('sha1'):
+        return rev['sha1']
+    if rev.get('text') is not None:
+        return hashlib.sha1(rev['text'].encode('utf-8')).hexdigest()
+    return None
+
+class RevisionResultCache:
+    """
+    Результаты проверки шаблонов по хэшу содержимого ревизии в пределах одной статьи.
+    Откаты и войны правок дают много ревизий с одинаковым текстом: такой текст
+    разбирается один раз, а для остальных ревизий результаты берутся из кэша
+    с датой и id самой ревизии.
+    """
+
+    def __init__(self):
+        self._results: Dict[str, Dict[str, Tuple[Optional[str], str]]] = {}
+        self._section_names: Dict[str, Optional[List[str]]] = {}  # Названия разделов (если собирались)
+        self.hits = 0
+
+    def get(self, content_hash: Optional[str], rev: Dict) -> Optional[Dict[str, Tuple[datetime, str, Optional[str], str]]]:
+        if content_hash is None or content_hash not in self._results:
+            return None
+        self.hits += 1
+        return {key: (rev['timestamp'], str(rev['revid']), found_section, variant_found)
+                for key, (found_section, variant_found) in self._results[content_hash].items()}
+
+    def section_names(self, content_hash: Optional[str]) -> Optional[List[str]]:
+        return self._section_names.get(content_hash)
+
+    def put(self, content_hash: Optional[str], results: Dict[str, Tuple[datetime, str, Optional[str], str]],
+            section_names: Optional[List[str]] = None) -> None:
+        if content_hash is not None:
+            self._results[content_hash] = {key: (found_section, variant_found)
+                                           for key, (_, _, found_section, variant_found) in results.items()}
+            self._section_names[content_hash] = section_names
+
+class IncrementalTemplateScanner:
+    """
+    Проверка шаблонов в последовательных ревизиях (линейные режимы поиска).
+    Соседние ревизии обычно различаются небольшим фрагментом: если изменённый фрагмент
+    не затрагивает ни одного шаблона предыдущей ревизии, не содержит фигурных и угловых скобок
+    и переводов строк, строка, в которой он находится, ни до, ни после правки не является
+    заголовком и не содержит "<!", "--" и ">", а число маркеров комментариев "<!--" и "-->"
+    в тексте не изменилось, то набор шаблонов, их разделы и названия разделов не меняются, и результаты
+    предыдущей ревизии переиспользуются (с датой и id текущей) без разбора текста.
+    Иначе текст разбирается полностью: разбор фрагмента отдельно от остального текста
+    может дать другое дерево (незакрытые скобки, комментарии, теги), поэтому он не используется.
+    Если with_sections=True, после каждой проверки ревизии с текстом в section_names лежат названия
+    её разделов (при переиспользовании результатов заголовки не менялись, поэтому не меняются и они).
+    """
+
+    def __init__(self, templates_to_find: List[Tuple[str, Optional[str], Dict[str, str]]], with_sections: bool = False):
+        self.templates_to_find = templates_to_find
+        self.with_sections = with_sections
+        self.section_names: Optional[List[str]] = None  # Названия разделов последней проверенной ревизии с текстом
+        self.previous_text: Optional[str] = None
+        self.previous_results: Dict[str, Tuple[datetime, str, Optional[str], str]] = {}
+        self.previous_extents: Optional[List[Tuple[int, int]]] = None
+        self.results_by_hash = RevisionResultCache()  # Результаты уже встречавшихся текстов
+        self.reused = 0    # Сколько ревизий обработано без разбора
+        self.analyzed = 0  # Сколько ревизий разобрано полностью
+
+    def check(self, rev: Dict) -> Dict[str, Tuple[datetime, str, Optional[str], str]]:
+        text = rev.get('text')
+        if text is None:
+            return {}
+        content_hash = revision_content_hash(rev)
+        
+        if self.previous_extents is not None:
+            extents = self._shifted_extents(text)
+            if extents is not None:
+                self.reused += 1
+                self.previous_text, self.previous_extents = text, extents
+                results = {key: (rev['timestamp'], str(rev['revid']), found_section, variant_found)
+                           for key, (_, _, found_section, variant_found) in self.previous_results.items()}
+                self.results_by_hash.put(content_hash, results, self.section_names)
+                return results
+        
+        # Такой же текст уже разбирался (например, до вандализма, который затем откатили)
+        results = self.results_by_hash.get(content_hash, rev)
+        if results is not None:
+            self.reused += 1
+            # Границы шаблонов для этого текста не хранятся, следующая ревизия будет разобрана полностью
+            self.previous_text, self.previous_results, self.previous_extents = text, results, None
+            self.section_names = self.results_by_hash.section_names(content_hash)
+            return results
+        
+        results, extents, self.section_names = analyze_revision_templates(
+            rev, self.templates_to_find, with_extents=True, with_sections=self.with_sections)
+        self.analyzed += 1
+        self.results_by_hash.put(content_hash, results, self.section_names)
+        self.previous_text, self.previous_results, self.previous_extents = text, results, extents
+        return results
+
+    def _shifted_extents(self, text: str) -> Optional[List[Tuple[int, int]]]:
+        """
+        Возвращает границы шаблонов в новом тексте, если правка позволяет переиспользовать
+        результаты предыдущей ревизии, иначе None.
+        """
+        previous = self.previous_text
+        if text == previous:
+            return self.previous_extents
+        
+        prefix = common_prefix_length(previous, text)
+        suffix = common_suffix_length(previous, text, min(len(previous), len(text)) - prefix)
+        old_end = len(previous) - suffix
+        new_end = len(text) - suffix
+        
+        # Правка не должна затрагивать скобки, теги, комментарии и переводы строк
+        for changed in (previous[prefix:old_end], text[prefix:new_end]):
+            if any(char in changed for char in '{}<>\n'):
+                return None
+        
+        # Правка не должна примыкать к скобкам и тегам: удаление или вставка символа между
+        # двумя "{" или "}" создаёт или разрушает шаблон, хотя сами скобки не изменились
+        for source, end in ((previous, old_end), (text, new_end)):
+            if (prefix > 0 and source[prefix - 1] in '{}[]<>') or (end < len(source) and source[end] in '{}[]<>'):
+                return None
+        
+        # Строка с правкой не должна быть заголовком (или началом вводного раздела) до и после правки
+        # и не должна содержать частей комментария ("<!", "--") и концов тегов (">"): правка рядом с ними
+        # может открыть или закрыть комментарий и скрыть или открыть шаблоны за пределами правки
+        for source, end in ((previous, old_end), (text, new_end)):
+            line_start = source.rfind('\n', 0, prefix) + 1
+            line_end = source.find('\n', end)
+            line = source[line_start:line_end if line_end != -1 else len(source)]
+            if line.lstrip().startswith('=') or any(marker in line for marker in ('<!', '--', '>')):
+                return None
+        
+        # Число открытых и закрытых комментариев в тексте не должно измениться
+        for marker in ('<!--', '-->'):
+            if previous.count(marker) != text.count(marker):
+                return None
+        
+        # Правка не должна затрагивать ни один шаблон предыдущей ревизии
+        for start, end in self.previous_extents:
+            if max(prefix, start) < min(old_end, end) or (prefix == old_end and start < prefix < end):
+                return None
+        
+        delta = new_end - old_end
+        return [(start + delta, end + delta) if start >= old_end else (start, end)
+                for start, end in self.previous_extents]
+
+def check_templates_in_chunk(revisions_chunk: List[Dict], templates_to_find: List[Tuple[str, Optional[str], Dict[str, str]]],
+                             with_sections: bool = False) -> List[Tuple[Dict[str, Tuple[datetime, str, Optional[str], str]], Optional[List[str]]]]:
+    """
+    Выполняется в дочернем процессе: проверяет наличие шаблонов в каждой ревизии порции.
+    Возвращает пары (результаты, названия разделов или None).
+    Кэш разбора ревизий дочернего процесса действует в пределах одной порции.
+    """
+    REVISION_PARSE_CACHE.start_article()
+    scanner = IncrementalTemplateScanner(templates_to_find, with_sections)
+    return [(scanner.check(rev), scanner.section_names if rev.get('text') is not None else None)
+            for rev in revisions_chunk]
+
+def get_parse_pool(workers: int) -> ProcessPoolExecutor:
+    """Возвращает общий для всего запуска пул процессов для разбора текстов ревизий"""
+    global PARSE_POOL
+    if PARSE_POOL is None:
+        PARSE_POOL = ProcessPoolExecutor(max_workers=workers)
+    return PARSE_POOL
+
+def shutdown_parse_pool() -> None:
+    """Завершает процессы пула разбора ревизий, если он был создан"""
+    global PARSE_POOL
+    if PARSE_POOL is not None:
+        PARSE_POOL.shutdown(cancel_futures=True)
+        PARSE_POOL = None
+
+def find_revert_jumps(revisions: List[Dict]) -> Dict[int, int]:
+    """
+    Находит откаты в истории: для ревизии i — ближайшую в порядке перебора ревизию j > i + 1
+    с тем же sha1, не дальше REVERT_MAX_DEPTH отменённых правок. Всё, что было сделано в ревизиях
+    i+1..j-1, отменено откатом к тексту i, поэтому на первое появление шаблона эти ревизии влиять не должны.
+    Пустой текст и ревизии без sha1 откатом не считаются: совпадение пустых текстов (например,
+    двух очисток страницы) не означает, что правки между ними отменены.
+    Метаданные ленивой истории при этом загружаются полностью (без текстов).
+    """
+    if isinstance(revisions, RevisionStream):
+        revisions._load_all()
+    get_metadata = revisions.metadata if isinstance(revisions, OnDemandRevisionList) else revisions.__getitem__
+    jumps = {}
+    next_index: Dict[str, int] = {}  # Ближайшая более поздняя (в порядке перебора) ревизия с таким sha1
+    for index in range(len(revisions) - 1, -1, -1):
+        rev_metadata = get_metadata(index)
+        content_hash = rev_metadata.get('sha1')
+        if not content_hash or content_hash == EMPTY_TEXT_SHA1 or rev_metadata.get('size') == 0:
+            continue
+        later_index = next_index.get(content_hash)
+        if later_index is not None and index + 1 < later_index <= index + REVERT_MAX_DEPTH + 1:
+            jumps[index] = later_index
+        next_index[content_hash] = index
+    return jumps
+
+def iter_indexed_revisions(revisions: List[Dict], start_index: int = 0,
+                           revert_jumps: Optional[Dict[int, int]] = None) -> Iterator[Tuple[int, Dict]]:
+    """
+    Перебирает пары (индекс, ревизия) начиная с start_index. Если заданы revert_jumps,
+    после ревизии i сразу переходит к ревизии revert_jumps[i], а тексты ленивой истории
+    запрашиваются пакетами только для ревизий, которые действительно будут проверены.
+    """
+    if not revert_jumps:
+        for rev_idx, rev in enumerate(revisions):
+            if rev_idx >= start_index:
+                yield rev_idx, rev
+        return
+    
+    on_demand = isinstance(revisions, OnDemandRevisionList)
+    available = revisions._available if on_demand else (lambda index: 0 <= index < len(revisions))
+    rev_idx = start_index
+    while available(rev_idx):
+        if on_demand and 'text' not in revisions.metadata(rev_idx):
+            batch, next_idx = [], rev_idx
+            while len(batch) < REVISION_TEXT_BATCH_SIZE and available(next_idx):
+                batch.append(next_idx)
+                next_idx = revert_jumps.get(next_idx, next_idx + 1)
+            revisions.prefetch(batch)
+        yield rev_idx, revisions[rev_idx]
+        rev_idx = revert_jumps.get(rev_idx, rev_idx + 1)
+
+def get_probe_points(range_info: Dict, count: int = 1) -> List[int]:
+    """
+    Следующие точки проверки диапазона бинарного поиска (режимы 3 и 4).
+    range_info содержит границы 'left' и 'right' и шаг галопа 'step' (None — бинарный поиск):
+    возвращаются очередные count шагов галопа от правого края или count равноотстоящих точек,
+    делящих диапазон на count + 1 частей.
+    """
+    left, right, step = range_info['left'], range_info['right'], range_info['step']
+    if step is None:
+        return sorted({left + (right - left) * i // (count + 1) for i in range(1, count + 1)})
+    points = []
+    while len(points) < count and right >= left:
+        points.append(max(left, right - step + 1))
+        right, step = points[-1] - 1, step * 2
+    return points
+
+def find_visible_revision(revisions: List[Dict], start_index: int, last_index: int,
+                          check_revision) -> Optional[int]:
+    """
+    Ближайшая ревизия с текстом среди start_index..last_index (режимы 3 и 4): скрытая ревизия
+    ничего не говорит о наличии шаблона, поэтому вместо неё проверяется следующая.
+    check_revision(индекс) проверяет ревизию (при необходимости загружая её текст).
+    Возвращает None, если все ревизии диапазона скрыты.
+    """
+    for rev_idx in range(start_index, last_index + 1):
+        check_revision(rev_idx)
+        rev_metadata = revisions.metadata(rev_idx) if isinstance(revisions, OnDemandRevisionList) else revisions[rev_idx]
+        if revision_content_hash(rev_metadata) is not None:
+            return rev_idx
+    return None
+
+def iter_revision_template_results(revisions: List[Dict], templates_to_find: List[Tuple[str, Optional[str], Dict[str, str]]],
+                                   start_index: int = 0, revert_jumps: Optional[Dict[int, int]] = None,
+                                   with_sections: bool = False
+                                   ) -> Iterator[Tuple[int, Dict, Dict[str, Tuple[datetime, str, Optional[str], str]], Optional[List[str]]]]:
+    """
+    Перебирает ревизии начиная с start_index в исходном порядке вместе с результатами
+    проверки шаблонов для каждой из них (IncrementalTemplateScanner: ревизия, отличающаяся
+    от предыдущей только текстом вне шаблонов и заголовков, не разбирается заново).
+    Четвёртый элемент — названия разделов ревизии, если with_sections=True и у ревизии есть текст, иначе None.
+    Откаченные диапазоны из revert_jumps (см. find_revert_jumps) пропускаются.
+    Если задан CONFIG['parse_workers'], тексты длинных историй разбираются порциями по
+    PARSE_CHUNK_SIZE ревизий в пуле процессов (не больше двух порций наперёд на процесс),
+    а результаты всё равно возвращаются строго по порядку ревизий. Когда потребитель
+    прекращает перебор (все шаблоны найдены), ещё не начатые порции отменяются.
+    """
+    workers = CONFIG.get('parse_workers', 0)
+    if workers <= 0 or len(revisions) - start_index <= PARSE_CHUNK_SIZE:
+        scanner = IncrementalTemplateScanner(templates_to_find, with_sections)
+        for rev_idx, rev in iter_indexed_revisions(revisions, start_index, revert_jumps):
+            results = scanner.check(rev)
+            yield rev_idx, rev, results, scanner.section_names if rev.get('text') is not None else None
+        return
+
+    pool = get_parse_pool(workers)
+    pending = deque()
+    try:
+        chunk = []
+        for rev_idx, rev in iter_indexed_revisions(revisions, start_index, revert_jumps):
+            chunk.append((rev_idx, rev))
+            if len(chunk) == PARSE_CHUNK_SIZE:
+                pending.append(_submit_revision_chunk(pool, chunk, templates_to_find, with_sections))
+                chunk = []
+                if len(pending) >= workers * 2:
+                    yield from _take_revision_chunk(*pending.popleft())
+        if chunk:
+            pending.append(_submit_revision_chunk(pool, chunk, templates_to_find, with_sections))
+        while pending:
+            yield from _take_revision_chunk(*pending.popleft())
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+def _submit_revision_chunk(pool: ProcessPoolExecutor, chunk: List[Tuple[int, Dict]],
+                           templates_to_find: List[Tuple[str, Optional[str], Dict[str, str]]], with_sections: bool = False):
+    # В дочерний процесс передаются только поля, нужные для проверки
+    revisions_chunk = [{'revid': rev['revid'], 'timestamp': rev['timestamp'], 'text': rev.get('text')}
+                       for _, rev in chunk]
+    return chunk, pool.submit(check_templates_in_chunk, revisions_chunk, templates_to_find, with_sections)
+
+def _take_revision_chunk(chunk: List[Tuple[int, Dict]], future
+                         ) -> Iterator[Tuple[int, Dict, Dict[str, Tuple[datetime, str, Optional[str], str]], Optional[List[str]]]]:
+    for (rev_idx, rev), (results, section_names) in zip(chunk, future.result()):
+        yield rev_idx, rev, results, section_names
 
 def find_template_and_section_history(page: pywikibot.Page, revisions: List[Dict], sections_to_track: Set[str], 
                                     templates_to_find: List[Tuple[str, Optional[str], Dict[str, str]]], 
@@ -1028,12 +2092,13 @@ def find_template_and_section_history(page: pywikibot.Page, revisions: List[Dict
 def get_template_addition_dates(page: pywikibot.Page, template_redirects: Dict[str, Dict[str, str]], search_mode: int, revisions: List[Dict] = None) -> Tuple[List[Tuple[str, str, str, str, str, Optional[str], str]], Dict[str, List[str]], Dict[str, Dict[str, str]]]: # Added 7th element to tuple
     try:
         if revisions is None:
-            creation_date, revision_count, revisions = get_revision_info(page)
+            creation_date, revision_count, revisions = get_revision_info(page, search_mode)
         
         print("\n🔍 Анализ текущей версии статьи...")
         current_text = page.text
         wikicode = mwparserfromhell.parse(current_text)
         current_sections = find_sections(current_text)
+        current_template_positions = index_template_positions(wikicode)
         template_info = cache_template_info(template_redirects)
         
         # Создаем словарь шаблонов с параметром "раздел"
@@ -1056,22 +2121,17 @@ def get_template_addition_dates(page: pywikibot.Page, template_redirects: Dict[s
         for template in wikicode.filter_templates():
             template_name = str(template.name).strip()
             
-            # Ищем совпадение без учета регистра в ключах all_variants
-            found_match = None
-            # Используем новую функцию сравнения
-            for variant_key, variant_value in template_info['all_variants'].items():
-                 if compare_template_names(template_name, variant_key):
-                    found_match = variant_value # (main_name, original_name)
-                    # Заменяем прямой print на print_debug
-                    print_debug(f"        >>> НАЙДЕН через compare_template_names! ('{template_name}' -> '{variant_key}' -> {found_match}) <<<") 
-                    break # Нашли первое совпадение, выходим
+            # Ищем вариант по каноническому ключу названия
+            found_match = template_info['canonical_variants'].get(canonical_template_name(template_name)) # (main_name, original_name)
+            if found_match:
+                print_debug(f"        >>> НАЙДЕН по каноническому ключу! ('{template_name}' -> {found_match}) <<<")
 
             if found_match:
                 # Используем найденное значение
                 main_name, original_name = found_match 
                 # main_name_lower больше не нужен для поиска ключа, но оставим для совместимости, если он где-то используется
                 main_name_lower = normalize_template_name(main_name) 
-                sections = get_section_for_template(wikicode, template, current_sections)
+                sections = get_section_for_template(wikicode, template, current_sections, current_template_positions)
 
                 # Собираем информацию о шаблоне
                 if main_name_lower not in template_counts:
@@ -1341,6 +2401,7 @@ def process_template_update(page: pywikibot.Page, template_dates: List[Tuple[str
             if normalize_template_name(m_name) == main_name_lower:
                 relevant_variants.add(variant)
         print_debug(f"      🔍 Ищем соответствия для: {list(relevant_variants)}")
+        relevant_keys = {canonical_template_name(variant) for variant in relevant_variants}
         # --- END CHANGE ---
 
         # Анализируем текст с помощью mwparserfromhell
@@ -1352,11 +2413,7 @@ def process_template_update(page: pywikibot.Page, template_dates: List[Tuple[str
             
             # --- START CHANGE ---
             # Проверяем, совпадает ли имя шаблона из текста с одним из релевантных вариантов
-            match_found_in_text = False
-            for known_variant in relevant_variants:
-                if compare_template_names(template_name, known_variant):
-                    match_found_in_text = True
-                    break
+            match_found_in_text = canonical_template_name(template_name) in relevant_keys
             
             if match_found_in_text:
             # --- END CHANGE ---
@@ -1649,16 +2706,19 @@ def process_template_update(page: pywikibot.Page, template_dates: List[Tuple[str
 
 def process_article_with_limit(page: pywikibot.Page, templates: Dict[str, Dict[str, str]], 
                               search_mode: int, max_revisions: int, revision_count: int,
-                              should_process_rq: bool) -> Tuple[bool, float, List[Tuple[str, str, str, str, str, Optional[str], str]], List[Optional[str]], Optional[Tuple[str, str]], Dict[str, Dict[str, str]]]:
+                              should_process_rq: bool, history_metadata: Optional[Union[List[Dict], RevisionStream]] = None,
+                              revisions: Optional[Union[List[Dict], OnDemandRevisionList]] = None) -> Tuple[bool, float, List[Tuple[str, str, str, str, str, Optional[str], str]], List[Optional[str]], Optional[Tuple[str, str]], Dict[str, Dict[str, str]]]:
     start_time = time.time()
+    REVISION_PARSE_CACHE.start_article()
     try:
         # Используем переданное количество ревизий вместо запроса
         if max_revisions > 0 and revision_count > max_revisions:
             print(f"⚠️ Пропуск статьи: превышено ограничение в {max_revisions} ревизий (найдено {revision_count})")
             return False, time.time() - start_time, [], [], None, {}
             
-        # Получаем информацию о ревизиях один раз
-        creation_date, revision_count, revisions = get_revision_info(page)
+        # Получаем информацию о ревизиях один раз (если история не передана готовой, например из дампа)
+        if revisions is None:
+            creation_date, revision_count, revisions = get_revision_info(page, search_mode, revision_count, history_metadata)
         
         # Сначала проверяем, нужно ли обработать шаблон Rq
         if should_process_rq:
@@ -1699,6 +2759,47 @@ def process_article_with_limit(page: pywikibot.Page, templates: Dict[str, Dict[s
         print(f"❌ Ошибка при обработке статьи: {e}")
         return False, time.time() - start_time, [], [], None, {}
 
+class AutosaveResults:
+    """
+    Итоги автосохранения правок.
+    Правки сохраняются через асинхронную очередь pywikibot (page.save(asynchronous=True)):
+    её единственный поток сохраняет их по порядку с учётом ограничения частоты правок,
+    а анализ следующих статей тем временем продолжается. Если в очереди уже
+    config.max_queue_size правок, постановка новой ждёт освобождения места.
+    Правка отправляется с id ревизии, на которой она основана: если статья с тех пор изменилась,
+    MediaWiki вернёт конфликт редактирования и правка попадёт в список неудачных.
+    """
+
+    def __init__(self):
+        self.saved = 0
+        self.failed: List[Tuple[str, str]] = []  # (название статьи, причина)
+
+    def save(self, page: pywikibot.Page, new_text: str, summary: str, base_revid: Optional[int]) -> None:
+        """Ставит правку в очередь сохранения pywikibot"""
+        page.text = new_text
+        kwargs = {'baserevid': base_revid} if base_revid else {}
+        try:
+            page.save(summary=summary, minor=True, asynchronous=True,
+                      callback=lambda saved_page, error: self._saved(saved_page, error, base_revid), **kwargs)
+        except pywikibot.exceptions.Error as e:
+            # Например, правка запрещена шаблоном {{nobots}}: это проверяется до постановки в очередь
+            self.failed.append((page.title(), str(e)))
+
+    def _saved(self, page: pywikibot.Page, error: Optional[Exception], base_revid: Optional[int]) -> None:
+        """Вызывается потоком сохранения pywikibot после каждой правки"""
+        if error is None:
+            self.saved += 1
+        elif isinstance(error, pywikibot.exceptions.EditConflictError):
+            self.failed.append((page.title(), f"конфликт редактирования, статья изменена после ревизии {base_revid}"))
+        else:
+            self.failed.append((page.title(), str(error)))
+
+    def wait(self) -> None:
+        """Дожидается сохранения всех поставленных в очередь правок"""
+        if pywikibot.page_put_queue.qsize():
+            print(f"\n⏳ Ожидание сохранения правок в очереди: {pywikibot.page_put_queue.qsize()}")
+        pywikibot.page_put_queue.join()
+
 def process_articles(site: pywikibot.Site, category_templates: Dict[str, Dict[str, str]], 
                     search_mode: int, category_counts: Dict[str, int],
                     process_rq_for_this_run: bool):
@@ -1707,6 +2808,7 @@ def process_articles(site: pywikibot.Site, category_templates: Dict[str, Dict[st
     total_articles = sum(category_counts.values())
     processed_articles = 0
     skipped_articles = []
+    autosave_results = AutosaveResults() if CONFIG['autosave'] else None
     
     for category_name, templates in category_templates.items():
         current_category += 1
@@ -1718,22 +2820,22 @@ def process_articles(site: pywikibot.Site, category_templates: Dict[str, Dict[st
         
         try:
             category = pywikibot.Category(site, category_name)
-            for page in category.articles():
+            for page, history_metadata in iter_preloaded_articles(site, category, search_mode):
                 current_article += 1
                 processed_articles += 1
 
-                # Получаем базовую информацию о статье без загрузки всех ревизий
-                creation_date = page.oldest_revision.timestamp
-                revision_count = page.revision_count()
+                # Базовая информация о статье берётся из заранее загруженного начала истории
+                creation_date, revision_count, revision_count_is_partial = get_history_summary(history_metadata)
                 
                 print_article_header(page, creation_date, revision_count,
                                    current_article, category_articles,
                                    current_category, total_categories,
-                                   processed_articles, total_articles)
+                                   processed_articles, total_articles, revision_count_is_partial)
 
                 try:
                     success, elapsed_time, template_dates, section_names, update_info, template_info = process_article_with_limit(
-                        page, templates, search_mode, CONFIG['max_revisions'], revision_count, process_rq_for_this_run
+                        page, templates, search_mode, CONFIG['max_revisions'], revision_count, process_rq_for_this_run,
+                        history_metadata
                     )
                     
                     if not success and elapsed_time is not None:
@@ -1745,13 +2847,9 @@ def process_articles(site: pywikibot.Site, category_templates: Dict[str, Dict[st
                     if update_info:
                         new_text, summary = update_info
                         
-                        if CONFIG['autosave']:
+                        if autosave_results is not None:
                             print(f"    💾 Автосохранение с описанием: {summary}") # ADDED
-                            try:
-                                page.text = new_text
-                                page.save(summary=summary, minor=True)
-                            except Exception as e:
-                                print(f"❌ Ошибка при сохранении статьи «{page.title()}»: {e}")
+                            autosave_results.save(page, new_text, summary, page.latest_revision_id)
                         else:
                             print("📝 Применение изменений...")
                             print(f"🔄 Будет сохранено с описанием: {summary}")
@@ -1805,6 +2903,72 @@ def process_articles(site: pywikibot.Site, category_templates: Dict[str, Dict[st
         print("\n📊 Статистика пропущенных статей:")
         print(f"Всего пропущено: {len(skipped_articles)}")
 
+    if autosave_results is not None:
+        autosave_results.wait()
+        print(f"\n💾 Сохранено правок: {autosave_results.saved}")
+        if autosave_results.failed:
+            print(f"❌ Не удалось сохранить: {len(autosave_results.failed)}")
+            for title, reason in autosave_results.failed:
+                print(f"    • {title}: {reason}")
+
+    if REVISION_STORE is not None:
+        print(f"\n💾 Хранилище ревизий: прочитано с диска {REVISION_STORE.hits}, загружено из API {REVISION_STORE.misses}")
+    print(f"🧩 Кэш разбора ревизий: попаданий {REVISION_PARSE_CACHE.hits}, промахов {REVISION_PARSE_CACHE.misses}")
+
+def process_dump(site: pywikibot.Site, templates: Dict[str, Dict[str, str]], search_mode: int):
+    """
+    Обрабатывает статьи из XML-дампа истории правок (CONFIG['dump_file']).
+    История правок берётся целиком из дампа, запросов истории к API не делается.
+    Предлагаемые правки не сохраняются в Википедию, а записываются в CONFIG['dump_output_file']
+    по одной JSON-строке на статью: название, id ревизии, на которой основана правка, описание и новый текст.
+    """
+    processed_articles = 0
+    proposed_edits = 0
+    skipped_articles = []
+
+    spool_handle, spool_file = tempfile.mkstemp(suffix='.sqlite')
+    os.close(spool_handle)
+    spool = RevisionStore(spool_file)
+
+    try:
+        with open(CONFIG['dump_output_file'], 'w', encoding='utf-8') as output:
+            for title, metadata, latest_text in iter_dump_pages(CONFIG['dump_file'], spool):
+                processed_articles += 1
+                page = DumpPage(site, title, latest_text, metadata[-1]['revid'])
+                revisions = DumpRevisionList(page, newest_first=(search_mode == 1), metadata=metadata, spool=spool)
+
+                print(f"⬜️⬜️⬜️ {title}")
+                print(f"    ✏️ Создана: {metadata[0]['timestamp'].strftime('%Y-%m-%d')}    📝 Всего ревизий: {len(metadata)}    📊 Статей из дампа: {processed_articles}, предложено правок: {proposed_edits}")
+
+                success, elapsed_time, template_dates, section_names, update_info, template_info = process_article_with_limit(
+                    page, templates, search_mode, CONFIG['max_revisions'], len(metadata), True,
+                    revisions=revisions
+                )
+
+                if not success:
+                    skipped_articles.append((title, elapsed_time))
+                elif update_info:
+                    new_text, summary = update_info
+                    output.write(json.dumps({
+                        'title': title,
+                        'base_revid': page.latest_revision_id,
+                        'summary': summary,
+                        'text': new_text,
+                    }, ensure_ascii=False) + '\n')
+                    proposed_edits += 1
+                    print(f"    📝 Правка записана в файл с описанием: {summary}")
+
+                print("=" * 100)
+    finally:
+        spool.close()
+        os.remove(spool_file)
+
+    print(f"\n📊 Обработано статей из дампа: {processed_articles}")
+    print(f"📝 Предложено правок: {proposed_edits} (записаны в {CONFIG['dump_output_file']})")
+    if skipped_articles:
+        print(f"Всего пропущено: {len(skipped_articles)}")
+    print(f"🧩 Кэш разбора ревизий: попаданий {REVISION_PARSE_CACHE.hits}, промахов {REVISION_PARSE_CACHE.misses}")
+
 def get_section_templates_with_redirects(site: pywikibot.Site) -> Dict[str, Dict[str, str]]:
     """
     Получает все шаблоны для разделов и их редиректы.
@@ -1845,6 +3009,9 @@ def get_rq_template_redirects(site: pywikibot.Site) -> Dict[str, str]:
     Получает все редиректы шаблона Rq.
     Возвращает словарь {редирект: написание_с_учетом_регистра}
     """
+    if RQ_TEMPLATE_REDIRECTS_CACHE:
+        return RQ_TEMPLATE_REDIRECTS_CACHE
+        
     redirects = {}
     # Основные названия шаблона Rq и его редиректов
     rq_templates = ["Rq", "Request", "Улучшить статью", "Multiple issues"]
@@ -1881,20 +3048,20 @@ def get_rq_template_redirects(site: pywikibot.Site) -> Dict[str, str]:
     for redirect in redirects.values():
         print_debug(f"  ↪️ «{redirect}»")
     
+    RQ_TEMPLATE_REDIRECTS_CACHE.update(redirects)
     return redirects
 
-def extract_rq_params(template: mwparserfromhell.nodes.Template) -> Tuple[List[str], Dict[str, str]]:
+def extract_rq_params(template: Union[mwparserfromhell.nodes.Template, ParsedTemplate]) -> Tuple[List[str], Dict[str, str]]:
     """
-    Извлекает параметры из шаблона Rq.
+    Извлекает параметры из шаблона Rq (объекта шаблона или шаблона из ParsedRevision).
     Возвращает кортеж: (список названий проблем статьи для конвертации, словарь специальных параметров).
     """
     params_for_conversion = []
     all_named_rq_params = {} # Для всех именованных: 'topic', 'fromlang', 'раздел', и т.д.
     
-    # Собираем параметры
-    for param in template.params:
-        param_name_lower = str(param.name).strip().lower()
-        param_value = str(param.value).strip() # Сохраняем оригинальное значение
+    # Собираем параметры (значение сохраняется в оригинальном регистре)
+    for param_name, param_value in iter_template_params(template):
+        param_name_lower = param_name.lower()
         
         # Проверяем специальные параметры
         if param_name_lower.isdigit(): # Неименованный параметр
@@ -1928,12 +3095,34 @@ def find_rq_param_addition_dates(page: pywikibot.Page, rq_templates: Dict[str, s
         page: Страница статьи
         rq_templates: Словарь редиректов шаблона Rq
         current_params: Список текущих параметров шаблона Rq в статье
-        search_mode: Режим поиска (1 - от последней ревизии, 2 - от первой, 3 - бинарный)
+        search_mode: Режим поиска (1 - от последней ревизии, 2 - от первой, 3 - бинарный, 4 - галоп от последней ревизии)
         revisions: Список ревизий статьи
         
     Returns:
         Dict[str, Tuple[datetime, str, str]]: Словарь {параметр: (дата, id_ревизии, имя_параметра_в_той_ревизии)}
     """
+    return find_rq_concept_addition_dates(page, rq_templates, current_params, [], search_mode, revisions)[0]
+
+def find_rq_concept_addition_dates(page: pywikibot.Page, rq_templates: Dict[str, str],
+                                   current_params: List[str], standalone_templates: List[Tuple[str, Optional[str], Dict[str, str]]],
+                                   search_mode: int, revisions: List[Dict]
+                                   ) -> Tuple[Dict[str, Tuple[datetime, str, str]], Dict[str, Tuple[datetime, str, Optional[str], str]]]:
+    """
+    За один проход по истории находит даты первого добавления каждого параметра шаблона Rq
+    и каждого самостоятельного шаблона-эквивалента (из RQ_PARAM_TEMPLATES).
+    
+    Args:
+        page: Страница статьи
+        rq_templates: Словарь редиректов шаблона Rq
+        current_params: Параметры всех шаблонов Rq статьи
+        standalone_templates: Самостоятельные шаблоны в формате templates_to_find (имя, None, редиректы)
+        search_mode: Режим поиска
+        revisions: Список ревизий статьи
+        
+    Returns:
+        (даты параметров {параметр: (дата, id_ревизии, имя_параметра_в_той_ревизии)},
+         даты самостоятельных шаблонов {ключ_шаблона: (дата, id_ревизии, None, название_в_той_ревизии)})
+    """
     # Очищаем и проверяем параметры
     valid_params = []
     for param in current_params:
@@ -1945,19 +3134,28 @@ def find_rq_param_addition_dates(page: pywikibot.Page, rq_templates: Dict[str, s
     
     if not valid_params:
         print("    ⚠️ Нет корректных параметров для поиска")
-        return {}
+        return {}, {}
     
     print(f"    ✅ Параметры для поиска: {', '.join(valid_params)}")
     
     # Используем универсальную функцию для поиска
-    return find_first_appearance(
+    concept_dates = find_first_appearance(
         page=page,
         revisions=revisions,
         search_mode=search_mode,
         template_search=False,
         rq_templates=rq_templates,
-        rq_params=valid_params
+        rq_params=valid_params,
+        standalone_templates=standalone_templates
     )
+    param_dates = {param: concept_dates[param] for param in valid_params if param in concept_dates}
+    standalone_dates = {}
+    for t_name, _, _ in standalone_templates:
+        standalone_key = f"{t_name}_None"
+        if standalone_key in concept_dates:
+            timestamp, revid, trigger = concept_dates[standalone_key]
+            standalone_dates[standalone_key] = (timestamp, revid, None, trigger)
+    return param_dates, standalone_dates
 
 def process_rq_template(page: pywikibot.Page, rq_templates: Dict[str, str], search_mode: int, revisions: List[Dict] = None) -> Tuple[bool, str, str]:
     """
@@ -1976,7 +3174,7 @@ def process_rq_template(page: pywikibot.Page, rq_templates: Dict[str, str], sear
         print_debug("🔍 Анализируем шаблоны Rq в статье...")
         
         if revisions is None:
-            _, _, revisions = get_revision_info(page)
+            _, _, revisions = get_revision_info(page, search_mode)
         
         current_text = page.text
         wikicode = mwparserfromhell.parse(current_text)
@@ -2030,50 +3228,46 @@ def process_rq_template(page: pywikibot.Page, rq_templates: Dict[str, str], sear
         changes_made = False
         processed_rq_details_for_summary = [] # Store details for summary generation
         
+        # Параметры всех шаблонов Rq статьи и их самостоятельные эквиваленты ищутся за один проход по истории
+        all_params = []
+        for _, params, _, _ in found_rq_templates:
+            all_params.extend(param for param in params if param not in all_params)
+        
+        print_debug("    🔄 Поиск дат для эквивалентных самостоятельных шаблонов...")
+        
+        # 1. Собрать все уникальные самостоятельные шаблоны-эквиваленты
+        unique_standalone_templates_to_search: Dict[str, str] = {} # {normalized_name: original_name}
+        for rq_param_name_for_standalone in all_params:
+            target_standalone_template_name = RQ_PARAM_TEMPLATES.get(rq_param_name_for_standalone.lower())
+            if target_standalone_template_name:
+                normalized_standalone = normalize_template_name(target_standalone_template_name)
+                if normalized_standalone not in unique_standalone_templates_to_search:
+                    unique_standalone_templates_to_search[normalized_standalone] = target_standalone_template_name
+        
+        # 2. Подготовить список самостоятельных шаблонов в формате templates_to_find
+        templates_to_find_for_all_standalones = []
+        if unique_standalone_templates_to_search:
+            print_debug(f"        🔍 Будут искаться standalone-эквиваленты: {list(unique_standalone_templates_to_search.values())}")
+            for norm_name, orig_name in unique_standalone_templates_to_search.items():
+                redirects = get_template_redirects(site, orig_name, use_rq_specific_cache=True)
+                if not redirects: # Должен всегда содержать хотя бы себя
+                    redirects = {orig_name: orig_name}
+                templates_to_find_for_all_standalones.append(
+                    (norm_name, None, redirects) # section_name is None
+                )
+        
+        # 3. Один проход по истории для параметров Rq и самостоятельных шаблонов
+        all_param_dates, standalone_template_addition_dates = find_rq_concept_addition_dates(
+            page, rq_templates, all_params, templates_to_find_for_all_standalones, search_mode, revisions)
+        print_debug(f"        ℹ️  Результаты поиска standalone (ключи): {list(standalone_template_addition_dates.keys())}")
+        
         # Обрабатываем каждый найденный шаблон
         for template, params, special_params, original_name in found_rq_templates:
-            # Находим даты добавления только для конвертируемых параметров
+            # Даты добавления конвертируемых параметров этого шаблона (найдены общим проходом выше)
             # param_dates_from_rq: Dict[str, Tuple[datetime, str, str (hist_rq_param_name)]]
-            param_dates_from_rq = find_rq_param_addition_dates(page, rq_templates, params, search_mode, revisions)
+            param_dates_from_rq = {param: all_param_dates[param] for param in params if param in all_param_dates}
             
-            # --- START NEW LOGIC: Find dates for equivalent standalone templates ---
             final_param_dates_with_triggers: Dict[str, Tuple[datetime, str, str, str]] = {}
-            
-            print_debug("    🔄 Поиск дат для эквивалентных самостоятельных шаблонов...")
-
-            # 1. Собрать все уникальные самостоятельные шаблоны-эквиваленты
-            unique_standalone_templates_to_search: Dict[str, str] = {} # {normalized_name: original_name}
-            for rq_param_name_for_standalone in params: # params - это параметры Rq из текущей статьи
-                target_standalone_template_name = RQ_PARAM_TEMPLATES.get(rq_param_name_for_standalone.lower())
-                if target_standalone_template_name:
-                    normalized_standalone = normalize_template_name(target_standalone_template_name)
-                    if normalized_standalone not in unique_standalone_templates_to_search:
-                        unique_standalone_templates_to_search[normalized_standalone] = target_standalone_template_name
-            
-            standalone_template_addition_dates: Dict[str, Tuple[datetime, str, Optional[str], str]] = {}
-            if unique_standalone_templates_to_search:
-                print_debug(f"        🔍 Будут искаться standalone-эквиваленты: {list(unique_standalone_templates_to_search.values())}")
-                
-                # 2. Подготовить templates_to_find для find_first_appearance
-                templates_to_find_for_all_standalones = []
-                for norm_name, orig_name in unique_standalone_templates_to_search.items():
-                    redirects = get_template_redirects(site, orig_name, use_rq_specific_cache=True)
-                    if not redirects: # Должен всегда содержать хотя бы себя
-                        redirects = {orig_name: orig_name}
-                    templates_to_find_for_all_standalones.append(
-                        (norm_name, None, redirects) # section_name is None
-                    )
-                
-                # 3. Один вызов find_first_appearance для всех уникальных standalone шаблонов
-                if templates_to_find_for_all_standalones:
-                    _, standalone_template_addition_dates = find_first_appearance(
-                        page, revisions, search_mode,
-                        template_search=True,
-                        templates_to_find=templates_to_find_for_all_standalones,
-                        sections_to_track=set(), 
-                        template_info={} # Не используется в этом режиме вызова find_first_appearance
-                    )
-                    print_debug(f"        ℹ️  Результаты поиска standalone (ключи): {list(standalone_template_addition_dates.keys())}")
 
             # 4. Сравнение дат и выбор наиболее ранней
             for rq_param_name, (rq_date, rq_revid, hist_rq_param_trigger) in param_dates_from_rq.items():
@@ -2378,7 +3572,9 @@ def find_first_appearance(page: pywikibot.Page,
                       sections_to_track: Set[str] = None,  # Для обычных шаблонов
                       template_info: Dict[str, Dict[str, str]] = None,  # Для обычных шаблонов
                       rq_templates: Dict[str, str] = None,  # Для параметров Rq
-                      rq_params: List[str] = None  # Для параметров Rq
+                      rq_params: List[str] = None,  # Для параметров Rq
+                      standalone_templates: List[Tuple[str, Optional[str], Dict[str, str]]] = None,  # Для параметров Rq: их самостоятельные эквиваленты
+                      skip_reverts: Optional[bool] = None  # None - брать из CONFIG['skip_reverts']
                      ) -> Union[Tuple[Dict[str, List[str]], Dict[str, Tuple[datetime, str, Optional[str], str]]], Dict[str, Tuple[datetime, str, str]]]:
     """
     Универсальная функция для поиска первого появления шаблонов или параметров шаблона Rq в статье.
@@ -2386,13 +3582,18 @@ def find_first_appearance(page: pywikibot.Page,
     Args:
         page: Страница статьи
         revisions: Список ревизий
-        search_mode: Режим поиска (1, 2 или 3)
+        search_mode: Режим поиска (1, 2, 3 или 4)
         template_search: True для поиска шаблонов, False для поиска параметров Rq
         templates_to_find: Список шаблонов для поиска (для обычных шаблонов)
         sections_to_track: Множество разделов для отслеживания (для обычных шаблонов)
         template_info: Информация о шаблонах (для обычных шаблонов)
         rq_templates: Словарь редиректов шаблона Rq (для параметров Rq)
         rq_params: Список параметров шаблона Rq для поиска (для параметров Rq)
+        standalone_templates: Самостоятельные шаблоны, которые ищутся в том же проходе, что и параметры Rq;
+            их даты возвращаются под ключами вида "имя_None" (для параметров Rq)
+        skip_reverts: В режимах 1 и 2 пропускать ревизии, отменённые откатом (см. find_revert_jumps).
+            Это меняет ответ, а не только скорость: шаблон, существовавший лишь в откаченных ревизиях,
+            не считается появившимся, а его удаление, отменённое откатом, не прерывает поиск
         
     Returns:
         Для template_search=True: Tuple[Dict[str, List[str]], Dict[str, Tuple[datetime, str, Optional[str], str]]]
@@ -2401,9 +3602,14 @@ def find_first_appearance(page: pywikibot.Page,
             словарь {параметр: (дата, id_ревизии, имя_параметра_в_той_ревизии)}
     """
     # Если search_mode == 1, разворачиваем список ревизий для поиска от конца
-    if search_mode == 1:
+    # (ленивая история для режима 1 уже загружается от новых ревизий к старым)
+    if search_mode == 1 and not (isinstance(revisions, RevisionStream) and revisions.newest_first):
         revisions = list(reversed(revisions))
     
+    if skip_reverts is None:
+        skip_reverts = CONFIG.get('skip_reverts', False)
+    revert_jumps = find_revert_jumps(revisions) if skip_reverts and search_mode in (1, 2) else {}
+    
     if template_search:
         # Логика поиска шаблонов как в функции find_template_and_section_history
         # Инициализируем историю всех разделов
@@ -2412,44 +3618,47 @@ def find_first_appearance(page: pywikibot.Page,
         total_sections = len(sections_to_track)
         total_revisions = len(revisions)
         
-        # Формируем ключи для templates_to_find_set единообразно
-        templates_to_find_set = set()
+        # Формируем ключи для templates_to_find_set единообразно; для каждого ключа запоминаем
+        # кортеж (название, раздел или None) первой записи templates_to_find с таким ключом
+        template_key_parts: Dict[str, Tuple[str, Optional[str]]] = {}
         for t_tuple in templates_to_find: # t_tuple is (template_name, section_name, variants)
             key_name_part = t_tuple[0] # normalized template name
             key_section_part = t_tuple[1] # section name or None
             current_key = f"{key_name_part}_{key_section_part}" if key_section_part is not None else f"{key_name_part}_None"
-            templates_to_find_set.add(current_key)
+            template_key_parts.setdefault(current_key, (key_name_part, key_section_part))
+        templates_to_find_set = set(template_key_parts)
+        
+        def track_section_names(section_names: List[str]) -> None:
+            # Для каждого отслеживаемого раздела ищем его историческое название в этой ревизии
+            for section_name in sections_to_track:
+                current_name = current_names[section_name]
+            
+                # Ищем похожий раздел среди всех разделов в этой ревизии
+                for found_name in section_names:
+                    if found_name in section_history[section_name]:
+                        continue
+                
+                    if sections_are_similar(current_name, found_name):
+                        section_history[section_name].append(found_name)
+                        current_names[section_name] = found_name  # Обновляем текущее название для следующей итерации
+                        break
         
-        # Проходим по ревизиям один раз для сбора истории всех разделов
-        if sections_to_track:  # Выполняем поиск истории разделов только если есть разделы для отслеживания
-            for rev_idx, rev in enumerate(revisions, 1):
+        def track_remaining_sections(start_index: int) -> None:
+            # Собирает историю разделов в ревизиях, до которых поиск шаблонов не дошёл
+            # (в режимах 3 и 4 — во всех ревизиях)
+            for rev_idx, rev in iter_indexed_revisions(revisions, start_index, revert_jumps):
                 if 'text' not in rev or rev['text'] is None:
                     continue
-                    
-                text = rev['text']
-                sections = find_sections(text)
-                
-                # Для каждого отслеживаемого раздела ищем его историческое название в этой ревизии
-                for section_name in sections_to_track:
-                    current_name = current_names[section_name]
-                
-                    # Ищем похожий раздел среди всех разделов в этой ревизии
-                    for found_name, _, _ in sections:
-                        if found_name in section_history[section_name]:
-                            continue
-                    
-                        if sections_are_similar(current_name, found_name):
-                            section_history[section_name].append(found_name)
-                            current_names[section_name] = found_name  # Обновляем текущее название для следующей итерации
-                            break
+                track_section_names([found_name for found_name, _, _ in find_sections(rev['text'])])
             
                 # Показываем прогресс каждые 5%
-                if rev_idx % max(1, total_revisions // 20) == 0:
-                    progress = (rev_idx / total_revisions) * 100
+                if (rev_idx + 1) % max(1, total_revisions // 20) == 0:
+                    progress = ((rev_idx + 1) / total_revisions) * 100
                     print(f"\r        🔍 Поиск истории разделов: {progress:.1f}%", end='', flush=True)
             
             print("\r", end='')  # Очищаем строку прогресса
-            
+        
+        def print_section_history() -> None:
             # Выводим результаты поиска истории разделов
             for section_name, history in section_history.items():
                 if search_mode == 1:
@@ -2461,12 +3670,49 @@ def find_first_appearance(page: pywikibot.Page,
                 else:
                     print(f"        📊 История раздела «{section_name}» (история не найдена)")
         
+        # В линейных режимах история разделов собирается в том же проходе, что и поиск шаблонов,
+        # по тому же разбору разделов ревизии; в режимах 3 и 4 поиск шаблонов проверяет лишь
+        # отдельные ревизии, поэтому историю разделов собираем отдельным проходом заранее
+        if sections_to_track and search_mode not in (1, 2):
+            track_remaining_sections(0)
+            print_section_history()
+        
         print_debug(f"    ⏳ Начинаем поиск дат добавления шаблонов...")
         template_results = {}  # Хранит (timestamp, revid, section_name_at_addition)
+        skipped_revisions = 0  # Сколько ревизий пропущено внутри откаченных диапазонов
         
         # Выбираем алгоритм поиска в зависимости от режима
         if search_mode == 1:  # Линейный поиск от конца
             # templates_to_find_set уже инициализирован выше
+            # Канонические ключи названия и редиректов каждого искомого шаблона (берётся первая запись с таким именем)
+            template_keys_by_name = {}
+            for t_name, _, t_variants in templates_to_find:
+                template_keys_by_name.setdefault(
+                    t_name, {canonical_template_name(t_name)} | {canonical_template_name(v) for v in t_variants})
+            # Искомые ключи по каноническому ключу названия шаблона или его редиректа
+            tracked_keys_by_name: Dict[str, List[str]] = {}
+            for template_key, (main_template, _) in template_key_parts.items():
+                for name_key in template_keys_by_name[main_template]:
+                    tracked_keys_by_name.setdefault(name_key, []).append(template_key)
+            tracked_keys_by_result: Dict[str, frozenset] = {}
+            
+            def get_tracked_keys(result_key: str) -> frozenset:
+                # Искомые ключи, которым соответствует ключ результата (тот же шаблон или его редирект
+                # и похожий раздел либо отсутствие раздела у обоих); вычисляется один раз для каждого ключа
+                if result_key not in tracked_keys_by_result:
+                    result_template, result_section = split_template_key(result_key)
+                    matched_keys = set()
+                    for template_key in tracked_keys_by_name.get(canonical_template_name(result_template), ()):
+                        section = template_key_parts[template_key][1]
+                        if section and result_section:
+                            is_same_section = sections_are_similar(section, result_section)
+                        else:
+                            is_same_section = not section and not result_section
+                        if is_same_section:
+                            matched_keys.add(template_key)
+                    tracked_keys_by_result[result_key] = frozenset(matched_keys)
+                return tracked_keys_by_result[result_key]
+            
             first_occurrences = {}
             revision_cache = {}
             
@@ -2478,93 +3724,48 @@ def find_first_appearance(page: pywikibot.Page,
             if revisions:
                 # Проверяем, доступна ли последняя ревизия
                 if 'text' not in revisions[0] or revisions[0]['text'] is None:
+                    if sections_to_track:
+                        track_remaining_sections(1)
+                        print_section_history()
                     print("        ⚠️ Последняя ревизия статьи недоступна!")
                     return {}, {}
                 
-                first_results = check_templates_in_revision(revisions[0], templates_to_find)
+                first_results, _, first_section_names = analyze_revision_templates(
+                    revisions[0], templates_to_find, with_sections=bool(sections_to_track))
                 revision_cache[0] = first_results
+                if sections_to_track:
+                    track_section_names(first_section_names)
                 
                 # Заполняем шаблоны из последней ревизии
-                for result_key, result_value in first_results.items():
-                    result_parts = result_key.split('_', 1)
-                    result_template = result_parts[0] 
-                    result_section = result_parts[1] if len(result_parts) > 1 else None
-                    
-                    for template_key in list(templates_to_find_set):
-                        template_parts = template_key.split('_', 1)
-                        main_template = template_parts[0]
-                        section = template_parts[1] if len(template_parts) > 1 else None
-                        
-                        templates_dict = next((t[2] for t in templates_to_find if t[0] == main_template), {})
-                        
-                        # Используем новую функцию сравнения
-                        is_same_template = compare_template_names(result_template, main_template)
-                        if not is_same_template:
-                            # Проверяем редиректы
-                            for redirect in templates_dict:
-                                if compare_template_names(result_template, redirect):
-                                    is_same_template = True
-                                    break
-                        
-                        is_same_section = True
-                        if section and result_section:
-                            is_same_section = sections_are_similar(section, result_section)
-                        elif section or result_section:
-                            is_same_section = False
-                        
-                        if is_same_template and is_same_section:
-                            templates_in_next_revision[template_key].add(result_key)
+                for result_key in first_results:
+                    for template_key in get_tracked_keys(result_key) & templates_to_find_set:
+                        templates_in_next_revision[template_key].add(result_key)
             
             print(f"\r        🔍 Поиск первого появления шаблонов (от последней ревизии)...", end='', flush=True)
             
             # Начинаем с индекса 1, так как 0 - это уже обработанная последняя ревизия
-            for rev_idx in range(1, len(revisions)):
-                current_rev = revisions[rev_idx]
-
+            last_checked_idx = 0
+            for rev_idx, current_rev, current_results, section_names in iter_revision_template_results(
+                    revisions, templates_to_find, start_index=1, revert_jumps=revert_jumps, with_sections=bool(sections_to_track)):
+                skipped_revisions += rev_idx - last_checked_idx - 1
+                last_checked_idx = rev_idx
+                if section_names is not None:
+                    track_section_names(section_names)
                 # Пропускаем удаленные/скрытые ревизии
                 if 'text' not in current_rev or current_rev['text'] is None:
                     # Сохраняем состояние предыдущей ревизии для следующей итерации
                     # Это важно, чтобы корректно обрабатывать ситуации, когда несколько ревизий подряд удалены
                     continue
 
-                # Проверяем текущую ревизию
-                current_results = check_templates_in_revision(current_rev, templates_to_find)
+                # Результаты проверки текущей ревизии
                 revision_cache[rev_idx] = current_results
 
                 # Обрабатываем найденные шаблоны в текущей ревизии
                 templates_in_revision = {key: set() for key in templates_to_find_set}
-                for result_key, result_value in current_results.items():
-                    result_parts = result_key.split('_', 1)
-                    result_template = result_parts[0] 
-                    result_section = result_parts[1] if len(result_parts) > 1 else None
-                    
-                    # Проверяем все искомые шаблоны
-                    for template_key in list(templates_to_find_set):
-                        template_parts = template_key.split('_', 1)
-                        main_template = template_parts[0]
-                        section = template_parts[1] if len(template_parts) > 1 else None
-                        
-                        # Получаем информацию о шаблоне и его редиректах
-                        templates_dict = next((t[2] for t in templates_to_find if t[0] == main_template), {})
-                        
-                        # Используем новую функцию сравнения
-                        is_same_template = compare_template_names(result_template, main_template)
-                        if not is_same_template:
-                            # Проверяем редиректы
-                            for redirect in templates_dict:
-                                if compare_template_names(result_template, redirect):
-                                    is_same_template = True
-                                    break
-                        
-                        is_same_section = True
-                        if section and result_section:
-                            is_same_section = sections_are_similar(section, result_section)
-                        elif section or result_section:  # Один есть, другого нет
-                            is_same_section = False
-                        
-                        # Если это тот же шаблон и нужный раздел, добавляем в текущие шаблоны
-                        if is_same_template and is_same_section:
-                            templates_in_revision[template_key].add(result_key)
+                for result_key in current_results:
+                    # Тот же шаблон (или редирект) в нужном разделе среди ещё не найденных
+                    for template_key in get_tracked_keys(result_key) & templates_to_find_set:
+                        templates_in_revision[template_key].add(result_key)
                 
                 # Находим шаблоны, которые есть в следующей (более новой) ревизии, но отсутствуют в текущей
                 for template_key in list(templates_to_find_set):
@@ -2596,8 +3797,7 @@ def find_first_appearance(page: pywikibot.Page,
                                 templates_to_find_set.remove(template_key)
                                 
                                 # Выводим информацию о найденном шаблоне
-                                template_name_for_log = next(t[0] for t in templates_to_find if (f"{t[0]}_{t[1]}" if t[1] is not None else f"{t[0]}_None") == template_key)
-                                section_name_for_log = next(t[1] for t in templates_to_find if (f"{t[0]}_{t[1]}" if t[1] is not None else f"{t[0]}_None") == template_key)
+                                template_name_for_log, section_name_for_log = template_key_parts[template_key]
                                 
                                 if section_name_for_log:
                                     print_debug(f"\n        ✨ [{template_name_for_log}] Найдено первое появление шаблона в разделе «{found_section}»: {timestamp.strftime('%Y-%m-%d')}")
@@ -2636,40 +3836,14 @@ def find_first_appearance(page: pywikibot.Page,
                 # Проверяем все оставшиеся ненайденные шаблоны
                 for template_key in list(templates_to_find_set):
                     for result_key, result_value in last_results.items():
-                        result_parts = result_key.split('_', 1)
-                        result_template = result_parts[0]
-                        result_section = result_parts[1] if len(result_parts) > 1 else None
-                        
-                        template_parts = template_key.split('_', 1)
-                        main_template = template_parts[0]
-                        section = template_parts[1] if len(template_parts) > 1 else None
-                        
-                        templates_dict = next((t[2] for t in templates_to_find if t[0] == main_template), {})
-                        
-                        # Используем новую функцию сравнения
-                        is_same_template = compare_template_names(result_template, main_template)
-                        if not is_same_template:
-                            # Проверяем редиректы
-                            for redirect in templates_dict:
-                                if compare_template_names(result_template, redirect):
-                                    is_same_template = True
-                                    break
-                        
-                        is_same_section = True
-                        if section and result_section:
-                            is_same_section = sections_are_similar(section, result_section)
-                        elif section or result_section:
-                            is_same_section = False
-                        
-                        if is_same_template and is_same_section:
+                        if template_key in get_tracked_keys(result_key):
                             # Шаблон найден в первой ревизии, значит он был добавлен при создании статьи
                             timestamp, revid, found_section, variant_found = result_value # Unpack variant_found
                             first_occurrences[template_key] = (timestamp, revid, found_section, variant_found) # Store variant_found
                             templates_to_find_set.remove(template_key)
                             
                             # Выводим информацию о найденном шаблоне
-                            template_name_for_log = next(t[0] for t in templates_to_find if (f"{t[0]}_{t[1]}" if t[1] is not None else f"{t[0]}_None") == template_key)
-                            section_name_for_log = next(t[1] for t in templates_to_find if (f"{t[0]}_{t[1]}" if t[1] is not None else f"{t[0]}_None") == template_key)
+                            template_name_for_log, section_name_for_log = template_key_parts[template_key]
                             
                             if section_name_for_log:
                                 print_debug(f"\n        ✨ [{template_name_for_log}] Найдено первое появление шаблона в разделе «{found_section}» (добавлен при создании статьи): {timestamp.strftime('%Y-%m-%d')}")
@@ -2677,6 +3851,10 @@ def find_first_appearance(page: pywikibot.Page,
                                 print_debug(f"\n        ✨ [{template_name_for_log}] Найдено первое появление шаблона (добавлен при создании статьи): {timestamp.strftime('%Y-%m-%d')}")
                             break
             
+            # История разделов в ревизиях, до которых поиск шаблонов не дошёл
+            if sections_to_track and revisions:
+                track_remaining_sections(revert_jumps.get(last_checked_idx, last_checked_idx + 1))
+            
             template_results = first_occurrences
             
         elif search_mode == 2:  # Линейный поиск от первой ревизии
@@ -2684,12 +3862,17 @@ def find_first_appearance(page: pywikibot.Page,
             first_occurrences = {}
             revision_cache = {}
             
-            for rev_idx, rev in enumerate(revisions):
+            last_checked_idx = -1
+            for rev_idx, rev, current_results, section_names in iter_revision_template_results(
+                    revisions, templates_to_find, revert_jumps=revert_jumps, with_sections=bool(sections_to_track)):
+                skipped_revisions += rev_idx - last_checked_idx - 1
+                last_checked_idx = rev_idx
+                if section_names is not None:
+                    track_section_names(section_names)
                 # Пропускаем удаленные/скрытые ревизии
                 if 'text' not in rev or rev['text'] is None:
                     continue
                 
-                current_results = check_templates_in_revision(rev, templates_to_find)
                 revision_cache[rev_idx] = current_results
                 
                 for template_key in list(templates_to_find_set):
@@ -2700,8 +3883,7 @@ def find_first_appearance(page: pywikibot.Page,
                         templates_to_find_set.remove(template_key)
                         
                         # Выводим информацию о найденном шаблоне
-                        template_name_for_log = next(t[0] for t in templates_to_find if (f"{t[0]}_{t[1]}" if t[1] is not None else f"{t[0]}_None") == template_key)
-                        section_name_for_log = next(t[1] for t in templates_to_find if (f"{t[0]}_{t[1]}" if t[1] is not None else f"{t[0]}_None") == template_key)
+                        template_name_for_log, section_name_for_log = template_key_parts[template_key]
                         if section_name_for_log:
                             print_debug(f"\n        ✨ [{template_name_for_log}] Найдено первое появление шаблона в разделе «{found_section}»: {timestamp.strftime('%Y-%m-%d')}")
                         else:
@@ -2715,10 +3897,17 @@ def find_first_appearance(page: pywikibot.Page,
                 if not templates_to_find_set:  # Если нашли все шаблоны
                     break
                     
+            # История разделов в ревизиях, до которых поиск шаблонов не дошёл
+            if sections_to_track and revisions:
+                track_remaining_sections(revert_jumps.get(last_checked_idx, last_checked_idx + 1))
+            
             template_results = first_occurrences
             
-        else:  # Бинарный поиск (search_mode == 3)
-            # Логика бинарного поиска (можно перенести из find_template_and_section_history)
+        else:  # Бинарный поиск (search_mode == 3) или галоп от последней ревизии (search_mode == 4)
+            # Логика бинарного поиска (можно перенести из find_template_and_section_history).
+            # В режиме 4 диапазон каждого шаблона сначала сужается от последней ревизии шагами
+            # 1, 2, 4, 8... до первой ревизии без шаблона, а затем внутри последнего шага — бинарным поиском,
+            # поэтому недавно добавленный шаблон находится за O(log d), где d — расстояние от последней ревизии
             first_occurrences = {}
             revision_cache = {}
             checked_revisions = set()  # Множество для отслеживания проверенных ревизий
@@ -2732,7 +3921,10 @@ def find_first_appearance(page: pywikibot.Page,
                 key_name_part_range = t_tuple_range[0]
                 key_section_part_range = t_tuple_range[1]
                 current_key_range = f"{key_name_part_range}_{key_section_part_range}" if key_section_part_range is not None else f"{key_name_part_range}_None"
-                search_ranges[current_key_range] = {'left': 0, 'right': len(revisions) - 1, 'first_found': None}
+                search_ranges[current_key_range] = {'left': 0, 'right': len(revisions) - 1, 'first_found': None,
+                                                    'step': 1 if search_mode == 4 else None}  # Шаг галопа (None - бинарный поиск)
+            
+            results_by_hash = RevisionResultCache()  # Одинаковые тексты (откаты) разбираются один раз
             
             def check_revision(rev_idx: int) -> Dict[str, Tuple[datetime, str, str]]:
                 if rev_idx < 0 or rev_idx >= total_revisions:
@@ -2742,6 +3934,13 @@ def find_first_appearance(page: pywikibot.Page,
                 if rev_idx in revision_cache:
                     return revision_cache[rev_idx]
                 
+                # Если ревизия с таким же sha1 уже проверялась, текст не нужен вовсе
+                rev_metadata = revisions.metadata(rev_idx) if isinstance(revisions, OnDemandRevisionList) else revisions[rev_idx]
+                cached_results = results_by_hash.get(revision_content_hash(rev_metadata), rev_metadata)
+                if cached_results is not None:
+                    revision_cache[rev_idx] = cached_results
+                    return cached_results
+                
                 # Проверяем наличие текста в ревизии
                 rev = revisions[rev_idx]
                 if 'text' not in rev or rev['text'] is None:
@@ -2749,10 +3948,43 @@ def find_first_appearance(page: pywikibot.Page,
                     revision_cache[rev_idx] = {}
                     return {}
                 
-                current_results = check_templates_in_revision(revisions[rev_idx], templates_to_find)
+                current_results = check_templates_in_revision(rev, templates_to_find)
+                results_by_hash.put(revision_content_hash(rev), current_results)
                 revision_cache[rev_idx] = current_results
                 return current_results
             
+            def apply_probe(rev_idx: int) -> None:
+                # Проверенная ревизия сужает диапазон каждого шаблона, в который она попадает;
+                # вместо скрытой ревизии проверяется ближайшая следующая ревизия с текстом
+                containing_ranges = [range_info for range_info in search_ranges.values()
+                                     if range_info['left'] <= rev_idx <= range_info['right']]
+                if not containing_ranges:
+                    return
+                visible_idx = find_visible_revision(revisions, rev_idx, max(range_info['right'] for range_info in containing_ranges),
+                                                    check_revision)
+                results = check_revision(visible_idx) if visible_idx is not None else {}
+                for template_key, range_info in search_ranges.items():
+                    if range_info['left'] <= rev_idx <= range_info['right']:
+                        if visible_idx is None or visible_idx > range_info['right']:
+                            # От точки проверки до конца диапазона все ревизии скрыты
+                            range_info['right'] = rev_idx - 1
+                        elif template_key in results:
+                            # Сохраняем вхождение как потенциально первое и продолжаем поиск в более ранних ревизиях
+                            range_info['first_found'] = results[template_key]
+                            range_info['right'] = rev_idx - 1
+                            if range_info['step'] is not None:
+                                range_info['step'] *= 2
+                        else:
+                            # Шаблон не найден, ищем в более поздних ревизиях
+                            range_info['left'] = visible_idx + 1
+                            range_info['step'] = None  # Галоп закончен, дальше бинарный поиск
+            
+            # Тексты для k-ичного поиска запрашиваются одним пакетом на раунд, поэтому он имеет смысл,
+            # только когда тексты загружаются из API по требованию
+            kary_probes = CONFIG.get('kary_probes', 1)
+            if not isinstance(revisions, OnDemandRevisionList) or isinstance(revisions, DumpRevisionList):
+                kary_probes = 1
+            
             # Продолжаем поиск, пока есть непроверенные диапазоны
             while search_ranges:
                 iterations += 1
@@ -2767,8 +3999,7 @@ def find_first_appearance(page: pywikibot.Page,
                             # first_found уже должен быть кортежем из 4 элементов
                             timestamp, revid, found_section, variant_found = range_info['first_found'] # Unpack variant_found
                             first_occurrences[template_key] = (timestamp, revid, found_section, variant_found) # Store variant_found (already should be correct)
-                            template_name_for_log = next((t[0] for t in templates_to_find if (f"{t[0]}_{t[1]}" if t[1] is not None else f"{t[0]}_None") == template_key), "")
-                            section_name_for_log = next((t[1] for t in templates_to_find if (f"{t[0]}_{t[1]}" if t[1] is not None else f"{t[0]}_None") == template_key), None)
+                            template_name_for_log, section_name_for_log = template_key_parts.get(template_key, ("", None))
                             if section_name_for_log:
                                 print_debug(f"\n        ✨ [{template_name_for_log}] Найдено первое появление шаблона с параметром 'раздел' в разделе «{found_section}»: {timestamp.strftime('%Y-%m-%d')}")
                             elif found_section: # Для шаблонов разделов, где section_name_for_log может быть None, если t_tuple[1] был None
@@ -2784,52 +4015,32 @@ def find_first_appearance(page: pywikibot.Page,
                 if not search_ranges:  # Все диапазоны исчерпаны
                     break
                                                     
-                # Выбираем следующую точку для проверки (обрабатываем по одному диапазону за раз)
+                # Выбираем точку, которая делит как можно больше активных диапазонов сразу:
+                # очередную точку (середину или шаг галопа) того диапазона, в который попадает больше всего других
                 next_mid = None
-                next_template_key = None
-                
-                # Выбираем один диапазон для проверки (вместо группировки)
-                for template_key, range_info in search_ranges.items():
-                    if range_info['left'] <= range_info['right']:
-                        next_mid = (range_info['left'] + range_info['right']) // 2
-                        next_template_key = template_key
-                        break
+                next_range = None
+                best_score = (0, 0)
+                for range_info in search_ranges.values():
+                    mid = get_probe_points(range_info)[0]
+                    overlap = sum(1 for other in search_ranges.values() if other['left'] <= mid <= other['right'])
+                    # При равенстве предпочитаем более широкий диапазон: его середина делит его пополам
+                    score = (overlap, range_info['right'] - range_info['left'])
+                    if score > best_score:
+                        next_mid, next_range, best_score = mid, range_info, score
                                         
                 if next_mid is None:  # Не нашли точку для проверки
                     break
-                    
-                # Проверяем выбранную точку
-                current_results = check_revision(next_mid)
                 
-                # Обновляем диапазон для выбранного шаблона
-                if next_template_key not in search_ranges:
-                    continue  # Шаблон мог быть удален в другом потоке
+                probes = [next_mid]
+                if kary_probes > 1:
+                    # k-ичный раунд: тексты k точек выбранного диапазона загружаются одним запросом
+                    # вместо k последовательных
+                    probes = get_probe_points(next_range, kary_probes)
+                    revisions.prefetch([probe for probe in probes if probe not in revision_cache])
                     
-                range_info = search_ranges[next_template_key]
-                
-                if next_template_key in current_results:
-                    # Нашли шаблон, проверяем предыдущую ревизию
-                    if next_mid > 0:
-                        prev_results = check_revision(next_mid - 1)
-                        if next_template_key not in prev_results:
-                            # Это первое появление
-                            first_occurrences[next_template_key] = current_results[next_template_key]
-                            search_ranges.pop(next_template_key, None)
-                            timestamp, revid, found_section, variant_found = current_results[next_template_key]
-                            template_name_for_log = next((t[0] for t in templates_to_find if (f"{t[0]}_{t[1]}" if t[1] is not None else f"{t[0]}_None") == next_template_key), "")
-                            section_name_for_log = next((t[1] for t in templates_to_find if (f"{t[0]}_{t[1]}" if t[1] is not None else f"{t[0]}_None") == next_template_key), None)
-                            if section_name_for_log:
-                                print_debug(f"\n        ✨ [{template_name_for_log}] Найдено первое появление шаблона в разделе «{found_section}»: {timestamp.strftime('%Y-%m-%d')}")
-                            else:
-                                print_debug(f"\n        ✨ [{template_name_for_log}] Найдено первое появление шаблона: {timestamp.strftime('%Y-%m-%d')}")
-                            continue
-                    
-                    # Сохраняем это вхождение как потенциально первое и продолжаем поиск в более ранних ревизиях
-                    range_info['first_found'] = current_results[next_template_key]
-                    range_info['right'] = next_mid - 1
-                else:
-                    # Шаблон не найден, ищем в более поздних ревизиях
-                    range_info['left'] = next_mid + 1
+                # Проверяем выбранные точки; каждая сужает все диапазоны, в которые она попадает
+                for probe in probes:
+                    apply_probe(probe)
                 
                 # Обновляем прогресс каждые несколько итераций
                 if iterations % 5 == 0:
@@ -2847,10 +4058,18 @@ def find_first_appearance(page: pywikibot.Page,
             print(f"\r        🔍 Поиск шаблонов: {templates_found}/{total_templates} (проверено ревизий: {checked_count}/{total_revisions}, {checked_percent:.1f}%)", end='', flush=True)
             
             print(f"\n        📊 Всего проверено {len(checked_revisions)} из {total_revisions} ревизий ({(len(checked_revisions) / total_revisions * 100):.1f}%)")
+            if isinstance(revisions, OnDemandRevisionList):
+                print(f"        📥 Загружено текстов ревизий: {revisions.fetched_texts}")
             print(f"        ⏱️ Время поиска: {(time.time() - start_time):.1f} секунд, выполнено {iterations} итераций")
             
             template_results = first_occurrences
         print()
+        # В линейных режимах история разделов известна только после прохода по ревизиям,
+        # поэтому она выводится сразу после его завершения; прогресс поиска выводится по ходу поиска
+        if sections_to_track and search_mode in (1, 2):
+            print_section_history()
+        if revert_jumps:
+            print(f"        ⏭️ Пропущено ревизий в откаченных диапазонах: {skipped_revisions}")
         print_debug("\n    ✅ Поиск дат добавления шаблонов завершен")
         return section_history, template_results
     
@@ -2862,9 +4081,16 @@ def find_first_appearance(page: pywikibot.Page,
         # Результаты поиска {ключ_параметра_из_последней_версии: (дата, id_ревизии, имя_параметра_в_той_ревизии)}
         param_dates: Dict[str, Tuple[datetime, str, str]] = {}
         
+        # Самостоятельные эквиваленты отслеживаются наравне с параметрами: их ключи ("имя_None")
+        # добавляются к rq_params, а триггером служит название шаблона в ревизии
+        standalone_templates = standalone_templates or []
+        standalone_matcher = get_variant_matcher(standalone_templates) if standalone_templates else {}
+        standalone_keys = {f"{t_name}_None" for t_name, _, _ in standalone_templates}
+        rq_params = list(rq_params) + [key for key in (f"{t_name}_None" for t_name, _, _ in standalone_templates) if key not in rq_params]
+        
         print_debug(f"    ⏳ Начинаем поиск дат добавления параметров шаблона Rq...")
         print_debug(f"       Параметры для поиска: {', '.join(rq_params)}")
-        print_debug(f"       Режим поиска: {search_mode} ({('от последней ревизии' if search_mode == 1 else 'от первой ревизии' if search_mode == 2 else 'бинарный поиск')})")
+        print_debug(f"       Режим поиска: {search_mode} ({('от последней ревизии' if search_mode == 1 else 'от первой ревизии' if search_mode == 2 else 'галоп от последней ревизии' if search_mode == 4 else 'бинарный поиск')})")
         print_debug(f"       Количество ревизий: {len(revisions)}")
         
         # --- START MODIFICATION ---
@@ -2877,16 +4103,24 @@ def find_first_appearance(page: pywikibot.Page,
         
         # Вспомогательная функция для определения, какие концепции из rq_params присутствуют в ревизии
         # и какой конкретно исторический параметр их вызвал.
-        def get_hist_triggers_for_concepts(text: Optional[str], target_rq_params_list: List[str]) -> Dict[str, Optional[str]]:
+        def get_hist_triggers_for_concepts(rev: Dict, target_rq_params_list: List[str]) -> Dict[str, Optional[str]]:
             # Инициализируем все ключи (параметры из последней версии) как None (триггер не найден)
             hist_triggers_map: Dict[str, Optional[str]] = {lp: None for lp in target_rq_params_list}
-            if text is None:
+            if rev.get('text') is None:
                 return hist_triggers_map
             
             try:
-                wikicode_rev = mwparserfromhell.parse(text)
-                for template_rev in wikicode_rev.filter_templates():
-                    template_name_rev_lower = str(template_rev.name).strip().lower()
+                # Разбор ревизии общий с поиском шаблонов (REVISION_PARSE_CACHE)
+                for template_rev in REVISION_PARSE_CACHE.get(rev).templates:
+                    template_name_rev = template_rev.name
+                    # Самостоятельный шаблон-эквивалент (как при поиске шаблонов: без параметра "раздел",
+                    # триггером остаётся название последнего такого шаблона в тексте)
+                    for entry_index in standalone_matcher.get(canonical_template_name(template_name_rev), ()):
+                        standalone_key = f"{standalone_templates[entry_index][0]}_None"
+                        if standalone_key in hist_triggers_map and not has_section_parameter(template_rev):
+                            hist_triggers_map[standalone_key] = template_name_rev
+                    
+                    template_name_rev_lower = template_name_rev.lower()
                     if template_name_rev_lower in normalized_redirects: # Это Rq шаблон
                         params_in_hist_template, _ = extract_rq_params(template_rev)
                         
@@ -2911,21 +4145,140 @@ def find_first_appearance(page: pywikibot.Page,
                 pass 
             return hist_triggers_map
 
+        # Предфильтр по названиям шаблонов ещё не найденных концепций: ревизию без них можно не разбирать,
+        # ведь у ненайденных концепций в ней заведомо нет триггеров, а найденные больше не проверяются
+        prefilter_state = {'found': -1, 'pattern': None}
+        def get_unfound_concepts_prefilter() -> re.Pattern:
+            if prefilter_state['found'] != len(param_dates):
+                entries = [entry for entry in standalone_templates if f"{entry[0]}_None" not in param_dates]
+                if any(key not in param_dates and key not in standalone_keys for key in rq_params):
+                    entries.append(('Rq', None, normalized_redirects))
+                prefilter_state['found'] = len(param_dates)
+                prefilter_state['pattern'] = get_template_prefilter(entries)
+            return prefilter_state['pattern']
+
         # Для режима 1: инициализируем состояние hist_triggers_in_next_rev на основе самой последней ревизии
         if search_mode == 1 and revisions:
             latest_chronological_rev = revisions[0]
             next_rev_timestamp = latest_chronological_rev['timestamp']
             next_rev_id = latest_chronological_rev['revid']
             if 'text' in latest_chronological_rev:
-                 hist_triggers_in_next_rev = get_hist_triggers_for_concepts(latest_chronological_rev['text'], rq_params)
+                 hist_triggers_in_next_rev = get_hist_triggers_for_concepts(latest_chronological_rev, rq_params)
             else:
                 print("        ⚠️ Не удалось обработать последнюю ревизию для инициализации поиска Rq параметров.")
         # --- END MODIFICATION ---
         
+        if search_mode in (3, 4):
+            # Бинарный поиск (режим 3) или галоп от последней ревизии (режим 4) сразу по всем концепциям:
+            # у каждой концепции свой диапазон, а каждая проверенная ревизия сужает все диапазоны,
+            # в которые попадает. Как и в режиме 2, результат — первая ревизия с триггером концепции
+            # (для историй, где концепция после добавления не удалялась)
+            total_revisions = len(revisions)
+            start_time = time.time()
+            iterations = 0
+            triggers_by_index: Dict[int, Dict[str, Optional[str]]] = {}
+            triggers_by_hash: Dict[str, Dict[str, Optional[str]]] = {}  # Одинаковые тексты (откаты) разбираются один раз
+            search_ranges = {param_key: {'left': 0, 'right': total_revisions - 1, 'first_found': None,
+                                         'step': 1 if search_mode == 4 else None}  # Шаг галопа (None - бинарный поиск)
+                             for param_key in rq_params}
+            
+            def get_revision_metadata_at(rev_idx: int) -> Dict:
+                return revisions.metadata(rev_idx) if isinstance(revisions, OnDemandRevisionList) else revisions[rev_idx]
+            
+            def check_concepts_in_revision(rev_idx: int) -> Dict[str, Optional[str]]:
+                if rev_idx in triggers_by_index:
+                    return triggers_by_index[rev_idx]
+                
+                # Если ревизия с таким же sha1 уже проверялась, текст не нужен вовсе
+                content_hash = revision_content_hash(get_revision_metadata_at(rev_idx))
+                if content_hash is not None and content_hash in triggers_by_hash:
+                    triggers_by_index[rev_idx] = triggers_by_hash[content_hash]
+                    return triggers_by_index[rev_idx]
+                
+                rev = revisions[rev_idx]
+                triggers = get_hist_triggers_for_concepts(rev, rq_params)
+                if rev.get('text') is not None:
+                    triggers_by_hash[revision_content_hash(rev)] = triggers
+                triggers_by_index[rev_idx] = triggers
+                return triggers
+            
+            def apply_concepts_probe(rev_idx: int) -> None:
+                # Проверенная ревизия сужает диапазон каждой концепции, в который она попадает;
+                # вместо скрытой ревизии проверяется ближайшая следующая ревизия с текстом
+                containing_ranges = [range_info for range_info in search_ranges.values()
+                                     if range_info['left'] <= rev_idx <= range_info['right']]
+                if not containing_ranges:
+                    return
+                visible_idx = find_visible_revision(revisions, rev_idx, max(range_info['right'] for range_info in containing_ranges),
+                                                    check_concepts_in_revision)
+                triggers = check_concepts_in_revision(visible_idx) if visible_idx is not None else {}
+                rev_metadata = get_revision_metadata_at(visible_idx) if visible_idx is not None else None
+                for param_key, range_info in search_ranges.items():
+                    if range_info['left'] <= rev_idx <= range_info['right']:
+                        if visible_idx is None or visible_idx > range_info['right']:
+                            # От точки проверки до конца диапазона все ревизии скрыты
+                            range_info['right'] = rev_idx - 1
+                        elif triggers.get(param_key) is not None:
+                            range_info['first_found'] = (rev_metadata['timestamp'], str(rev_metadata['revid']), triggers[param_key])
+                            range_info['right'] = rev_idx - 1
+                            if range_info['step'] is not None:
+                                range_info['step'] *= 2
+                        else:
+                            range_info['left'] = visible_idx + 1
+                            range_info['step'] = None  # Галоп закончен, дальше бинарный поиск
+            
+            kary_probes = CONFIG.get('kary_probes', 1)
+            if not isinstance(revisions, OnDemandRevisionList) or isinstance(revisions, DumpRevisionList):
+                kary_probes = 1
+            
+            while search_ranges:
+                # Исчерпанные диапазоны дают результат (если триггер встречался)
+                for param_key in [key for key, range_info in search_ranges.items() if range_info['left'] > range_info['right']]:
+                    range_info = search_ranges.pop(param_key)
+                    if range_info['first_found'] is not None:
+                        param_dates[param_key] = range_info['first_found']
+                        found_timestamp, _, found_trigger = range_info['first_found']
+                        print_debug(f"        ✨ Найдено первое появление концепции «{param_key}» (как «{found_trigger}»): {found_timestamp.strftime('%Y-%m-%d')}")
+                if not search_ranges:
+                    break
+                iterations += 1
+                
+                # Как при поиске шаблонов: точка того диапазона, в который попадает больше всего других
+                next_mid, next_range, best_score = None, None, (0, 0)
+                for range_info in search_ranges.values():
+                    mid = get_probe_points(range_info)[0]
+                    overlap = sum(1 for other in search_ranges.values() if other['left'] <= mid <= other['right'])
+                    score = (overlap, range_info['right'] - range_info['left'])
+                    if score > best_score:
+                        next_mid, next_range, best_score = mid, range_info, score
+                if next_mid is None:
+                    break
+                
+                probes = [next_mid]
+                if kary_probes > 1:
+                    probes = get_probe_points(next_range, kary_probes)
+                    revisions.prefetch([probe for probe in probes if probe not in triggers_by_index])
+                for probe in probes:
+                    apply_concepts_probe(probe)
+                
+                print(f"\r        🔍 Поиск параметров: найдено {len(param_dates)}/{len(rq_params)} (проверено ревизий: {len(triggers_by_index)}/{total_revisions})", end='', flush=True)
+            
+            print(f"\n        📊 Всего проверено {len(triggers_by_index)} из {total_revisions} ревизий")
+            if isinstance(revisions, OnDemandRevisionList):
+                print(f"        📥 Загружено текстов ревизий: {revisions.fetched_texts}")
+            print(f"        ⏱️ Время поиска: {(time.time() - start_time):.1f} секунд, выполнено {iterations} итераций")
+            print_debug(f"\n    ✅ Найдены даты для {len(param_dates)}/{len(rq_params)} концепций параметров шаблона Rq")
+            return param_dates
+        
         # Просматриваем все ревизии
         start_index = 1 if search_mode == 1 and revisions else 0
-        for rev_idx in range(start_index, len(revisions)):
-            rev = revisions[rev_idx]
+        skipped_revisions, last_checked_idx = 0, start_index - 1
+        # Самостоятельные шаблоны в режиме 1 обрабатываются как при поиске шаблонов: ревизия без текста
+        # пропускается, а переход на границе с ней не считается добавлением
+        after_hidden_revision = False
+        for rev_idx, rev in iter_indexed_revisions(revisions, start_index, revert_jumps):
+            skipped_revisions += rev_idx - last_checked_idx - 1
+            last_checked_idx = rev_idx
             current_rev_timestamp = rev['timestamp']
             current_rev_id = rev['revid']
             
@@ -2938,6 +4291,8 @@ def find_first_appearance(page: pywikibot.Page,
                     # Для режима 1, если текущая (более старая) ревизия не имеет текста,
                     # а следующая (более новая, next_rev) имела триггер, то добавление произошло в next_rev.
                     for param_key in rq_params:
+                        if param_key in standalone_keys:
+                            continue
                         trigger_in_next = hist_triggers_in_next_rev.get(param_key)
                         if param_key not in param_dates and trigger_in_next is not None:
                             param_dates[param_key] = (next_rev_timestamp, str(next_rev_id), trigger_in_next)
@@ -2945,17 +4300,24 @@ def find_first_appearance(page: pywikibot.Page,
                 # Пропускаем основную логику для этой ревизии, т.к. нет текста
                 # В режиме 1, состояние next_rev обновится на это "пустое" состояние в конце итерации.
                 if search_mode == 1:
-                    hist_triggers_in_next_rev = hist_triggers_in_current_rev.copy() # станет {lp: None}
+                    hist_triggers_in_next_rev = {lp: hist_triggers_in_next_rev.get(lp) if lp in standalone_keys else None
+                                                 for lp in rq_params} # станет {lp: None} (кроме самостоятельных шаблонов)
                     next_rev_timestamp = current_rev_timestamp # дата этой "пустой" ревизии
                     next_rev_id = current_rev_id
+                    after_hidden_revision = True
                 continue
 
             current_text = rev['text']
-            hist_triggers_in_current_rev = get_hist_triggers_for_concepts(current_text, rq_params)
+            if current_text is not None and not get_unfound_concepts_prefilter().search(current_text):
+                hist_triggers_in_current_rev = {lp: None for lp in rq_params}
+            else:
+                hist_triggers_in_current_rev = get_hist_triggers_for_concepts(rev, rq_params)
             
             try:
                 if search_mode == 1:
                     for param_key in rq_params:
+                        if param_key in standalone_keys and (current_text is None or after_hidden_revision):
+                            continue
                         trigger_in_next = hist_triggers_in_next_rev.get(param_key)
                         trigger_in_current = hist_triggers_in_current_rev.get(param_key)
                         
@@ -2971,9 +4333,12 @@ def find_first_appearance(page: pywikibot.Page,
                             print_debug(f"        ✨ Найдено первое появление концепции «{param_key}» (как «{trigger_in_current}»): {current_rev_timestamp.strftime('%Y-%m-%d')}")
                 
                 if search_mode == 1:
+                    if current_text is None:
+                        hist_triggers_in_current_rev.update({key: hist_triggers_in_next_rev.get(key) for key in standalone_keys})
                     hist_triggers_in_next_rev = hist_triggers_in_current_rev.copy()
                     next_rev_timestamp = current_rev_timestamp
                     next_rev_id = current_rev_id
+                    after_hidden_revision = current_text is None
                 
                 if len(param_dates) == len(rq_params):
                     break
@@ -2985,12 +4350,12 @@ def find_first_appearance(page: pywikibot.Page,
             except Exception as e:
                 print(f"❌ Ошибка при обработке ревизии {current_rev_id}: {e}")
         
-        if search_mode == 1 and revisions:
+        if search_mode == 1 and revisions and (len(param_dates) < len(rq_params)):
             earliest_chronological_rev = revisions[-1]
             if 'text' in earliest_chronological_rev:
                 # Для режима 1, hist_triggers_in_next_rev должен содержать состояние самой ранней ревизии, если цикл дошел до нее.
                 # Но безопаснее пересчитать для самой ранней.
-                hist_triggers_in_earliest_rev = get_hist_triggers_for_concepts(earliest_chronological_rev['text'], rq_params)
+                hist_triggers_in_earliest_rev = get_hist_triggers_for_concepts(earliest_chronological_rev, rq_params)
                 for param_key in rq_params:
                     trigger_in_earliest = hist_triggers_in_earliest_rev.get(param_key)
                     if param_key not in param_dates and trigger_in_earliest is not None:
@@ -3002,13 +4367,15 @@ def find_first_appearance(page: pywikibot.Page,
             if 'text' in first_chronological_rev:
                 # hist_triggers_in_current_rev будет содержать состояние первой ревизии, если цикл дошел до нее
                 # и она была последней обработанной. Пересчитаем для ясности.
-                hist_triggers_in_first_rev = get_hist_triggers_for_concepts(first_chronological_rev['text'], rq_params)
+                hist_triggers_in_first_rev = get_hist_triggers_for_concepts(first_chronological_rev, rq_params)
                 for param_key in rq_params:
                     trigger_in_first = hist_triggers_in_first_rev.get(param_key)
                     if param_key not in param_dates and trigger_in_first is not None:
                         param_dates[param_key] = (first_chronological_rev['timestamp'], str(first_chronological_rev['revid']), trigger_in_first)
                         print_debug(f"        ✨ Найдено первое появление концепции «{param_key}» (как «{trigger_in_first}», в первой ревизии): {first_chronological_rev['timestamp'].strftime('%Y-%m-%d')}")
         print()
+        if revert_jumps:
+            print(f"        ⏭️ Пропущено ревизий в откаченных диапазонах: {skipped_revisions}")
         print_debug(f"\n    ✅ Найдены даты для {len(param_dates)}/{len(rq_params)} концепций параметров шаблона Rq")
         return param_dates
 
@@ -3091,16 +4458,16 @@ def handle_debug_mode(site: pywikibot.Site):
         else:
             print(f"❌ Категория '{category_source_for_templates}' для получения шаблонов в режиме отладки не существует.")
 
-    creation_date = page.oldest_revision.timestamp
-    revision_count = page.revision_count()
-    print_article_header(page, creation_date, revision_count, 1, 1, 1, 1, 1, 1)
+    history_metadata = prefetch_article_history(page, CONFIG['search_mode'])
+    creation_date, revision_count, revision_count_is_partial = get_history_summary(history_metadata)
+    print_article_header(page, creation_date, revision_count, 1, 1, 1, 1, 1, 1, revision_count_is_partial)
     print("=" * 100)
 
     if CONFIG['mode'] == 'metarq':
         print("\n--- Отладка: Этап 1 (Meta-логика) ---")
         success1, _, _, _, update_info1, _ = process_article_with_limit(
             page, debug_templates_for_meta_single, CONFIG['search_mode'], CONFIG['max_revisions'], revision_count,
-            should_process_rq=False
+            should_process_rq=False, history_metadata=history_metadata
         )
         if update_info1:
             handle_debug_save_interaction(page, update_info1[0], update_info1[1])
@@ -3137,22 +4504,15 @@ def handle_debug_mode(site: pywikibot.Site):
         print(f"--- Отладка: Логика режима '{CONFIG['mode']}' (process_rq: {_should_process_rq_debug}) ---")
         success, _, _, _, update_info, _ = process_article_with_limit(
             page, current_debug_templates_for_call, CONFIG['search_mode'], CONFIG['max_revisions'], revision_count,
-            should_process_rq=_should_process_rq_debug
+            should_process_rq=_should_process_rq_debug, history_metadata=history_metadata
         )
         if update_info:
             handle_debug_save_interaction(page, update_info[0], update_info[1])
         else:
             print(f"ℹ️ Отладка (Логика режима '{CONFIG['mode']}'): Нет изменений.")
 
-def main():
-    global RQ_STANDALONE_REDIRECT_CACHE
-    site = pywikibot.Site('ru', 'wikipedia')
-    print("🔑 Выполняется вход в систему...")
-    site.login()
-    print("✅ Вход выполнен успешно")
-    
-    RQ_STANDALONE_REDIRECT_CACHE = load_rq_redirect_cache_from_json(RQ_STANDALONE_REDIRECT_CACHE_FILE)
-    
+def run_mode(site: pywikibot.Site):
+    """Обработка в режиме CONFIG['mode'] (хранилище текстов ревизий уже открыто)"""
     if not RQ_STANDALONE_REDIRECT_CACHE:
         print("ℹ️ Кэш редиректов RQ пуст или не найден. Заполняем из RQ_PARAM_TEMPLATES...")
         unique_target_templates = set(RQ_PARAM_TEMPLATES.values())
@@ -3192,7 +4552,7 @@ def main():
             print("⚠️ Не найдены шаблоны в категории")
             return
 
-        article_count = len(list(pywikibot.Category(site, CONFIG['single_category']).articles()))
+        article_count = get_category_size(site, CONFIG['single_category'])
         category_templates = {CONFIG['single_category']: templates}
         category_counts = {CONFIG['single_category']: article_count}
         
@@ -3238,7 +4598,7 @@ def main():
             return
 
         templates = {} # Шаблоны из категории не нужны для режима Rq
-        article_count = len(list(pywikibot.Category(site, CONFIG['rq_category']).articles()))
+        article_count = get_category_size(site, CONFIG['rq_category'])
         category_templates = {CONFIG['rq_category']: templates}
         category_counts = {CONFIG['rq_category']: article_count}
 
@@ -3302,7 +4662,7 @@ def main():
             print("❌ Указанная категория Rq не существует. Пропуск этапа 2.")
         else:
             templates_rq_metarq = {} # Renamed to avoid conflict
-            article_count_rq_metarq = len(list(pywikibot.Category(site, CONFIG['rq_category']).articles())) # Renamed
+            article_count_rq_metarq = get_category_size(site, CONFIG['rq_category']) # Renamed
             rq_category_templates_metarq = {CONFIG['rq_category']: templates_rq_metarq}
             rq_category_counts_metarq = {CONFIG['rq_category']: article_count_rq_metarq}
 
@@ -3313,9 +4673,43 @@ def main():
             print("\n✅ Этап 2 (Rq) завершен.")
         print("\n✅ Режим 'metarq' полностью завершен.")
 
+    elif CONFIG['mode'] == 'dump':
+        CONFIG['process_rq'] = True
+        print(f"\n🔍 Обработка XML-дампа истории правок: {CONFIG['dump_file']}")
+        if not CONFIG['dump_file'] or not os.path.exists(CONFIG['dump_file']):
+            print("❌ Файл дампа не указан или не существует")
+            return
+
+        # Отслеживаемые шаблоны — из всех активных подкатегорий метакатегории
+        print(f"\n🔍 Сканирование метакатегории {CONFIG['meta_category']}...")
+        active_categories_with_counts = get_active_subcategories(site, CONFIG['meta_category'])
+        active_categories = [cat for cat, _ in active_categories_with_counts]
+        templates = {}
+        for cat_templates in get_templates_by_categories(site, active_categories).values():
+            templates.update(cat_templates)
+        print(f"📊 Отслеживается шаблонов: {len(templates)}")
+
+        process_dump(site, templates, CONFIG['search_mode'])
+
     else:
         print(f"❌ Неверный режим работы: {CONFIG['mode']}")
-        print("Допустимые значения: 'single', 'meta', 'rq' или 'metarq'")
+        print("Допустимые значения: 'single', 'meta', 'rq', 'metarq' или 'dump'")
+
+def main():
+    global RQ_STANDALONE_REDIRECT_CACHE, REVISION_STORE
+    site = pywikibot.Site('ru', 'wikipedia')
+    print("🔑 Выполняется вход в систему...")
+    site.login()
+    print("✅ Вход выполнен успешно")
+    
+    RQ_STANDALONE_REDIRECT_CACHE = load_rq_redirect_cache_from_json(RQ_STANDALONE_REDIRECT_CACHE_FILE)
+    REVISION_STORE = open_revision_store()
+    try:
+        run_mode(site)
+    finally:
+        shutdown_parse_pool()
+        if REVISION_STORE is not None:
+            REVISION_STORE.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,7 +1,9 @@
 import pywikibot
 import re
+import sqlite3
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
+from revision_store import REVISION_TEXT_BATCH_SIZE, RevisionStore, fetch_revision_texts
 
 # --- НАСТРОЙКИ СЦЕНАРИЕВ ОБРАБОТКИ ---
 PROCESSING_CONFIGS = [
@@ -24,8 +26,13 @@ PROCESSING_CONFIGS = [
         "rq_params_list": ["sources", "source"], # Предполагаем те же параметры, уточните если нужно
     },
 ]
+# Локальное хранилище текстов ревизий (общее с wp-maintenance-template-add-dates.py, "" - не использовать)
+REVISION_CACHE_FILE = "revision_texts_cache.sqlite"
 # --- КОНЕЦ НАСТРОЕК ---
 
+# Хранилище текстов ревизий, открывается в main()
+REVISION_STORE: Optional[RevisionStore] = None
+
 def get_template_redirects(site: pywikibot.Site, template_name: str) -> Dict[str, str]:
     """
     Получает все редиректы для заданного шаблона.
@@ -51,6 +58,16 @@ def get_template_redirects(site: pywikibot.Site, template_name: str) -> Dict[str
     
     return redirects
 
+def open_revision_store(filename: str) -> Optional[RevisionStore]:
+    """Открывает локальное хранилище текстов ревизий (общее с wp-maintenance-template-add-dates.py)."""
+    if not filename:
+        return None
+    try:
+        return RevisionStore(filename)
+    except sqlite3.Error as e:
+        print(f"Не удалось открыть хранилище текстов ревизий {filename}: {e}")
+        return None
+
 def build_template_pattern(template_name: str) -> str:
     """
     Создаёт регулярное выражение для поиска шаблона с учётом пробелов в имени.
@@ -95,22 +112,27 @@ def find_rq_sources_date(page: pywikibot.Page, rq_cutoff_date: datetime, rq_para
         return match.group(1).lower() # Возвращаем найденный параметр в нижнем регистре
     
     try:
-        for rev in page.revisions(content=True, reverse=True):
-            if 'text' not in rev or rev['text'] is None:
-                continue
-                
-            timestamp = rev['timestamp']
-            # Дата должна быть строго до rq_cutoff_date
-            if timestamp.date() >= rq_cutoff_date.date():
-                continue
-                
-            param_found = get_rq_params(rev['text'], rq_params_list)
-            if param_found:
-                return (
-                    timestamp.strftime("%Y-%m-%d"),
-                    str(rev['revid']),
-                    param_found
-                )
+        # Сначала получаем только метаданные ревизий, тексты загружаем порциями до первой находки
+        # Дата должна быть строго до rq_cutoff_date
+        candidate_revisions = [rev for rev in page.revisions(reverse=True)
+                               if rev['timestamp'].date() < rq_cutoff_date.date()]
+        
+        for i in range(0, len(candidate_revisions), REVISION_TEXT_BATCH_SIZE):
+            batch = candidate_revisions[i:i + REVISION_TEXT_BATCH_SIZE]
+            texts = fetch_revision_texts(page.site, [rev['revid'] for rev in batch], REVISION_STORE)
+            
+            for rev in batch:
+                text = texts.get(rev['revid'])
+                if text is None:
+                    continue
+                    
+                param_found = get_rq_params(text, rq_params_list)
+                if param_found:
+                    return (
+                        rev['timestamp'].strftime("%Y-%m-%d"),
+                        str(rev['revid']),
+                        param_found
+                    )
                 
     except Exception as e:
         print(f"Ошибка при получении истории ревизий для поиска параметров {rq_params_list}: {e}")
@@ -253,6 +275,7 @@ def main():
     """
     Основная функция программы.
     """
+    global REVISION_STORE
     site = pywikibot.Site('ru', 'wikipedia')
     site.login()
 
@@ -277,20 +300,26 @@ def main():
         print("Не удалось получить редиректы для указанных шаблонов. Проверьте имена шаблонов в конфигурации.")
         return
 
-    for config in PROCESSING_CONFIGS:
-        print(f"\n===== Запуск обработки для конфигурации: {config['category_name']} =====")
-        process_articles(
-            site=site, 
-            no_sources_redirects=all_redirects, # Передаем все собранные редиректы
-            category_name=config["category_name"],
-            main_template_name_for_summary=config["main_template_for_summary"],
-            bot_name=config["bot_name"],
-            replacement_date=config["replacement_date"],
-            rq_cutoff_date=config["rq_cutoff_date"],
-            rq_params_list=config["rq_params_list"]
-        )
-    
-    print("\n===== Все конфигурации обработаны =====")
+    REVISION_STORE = open_revision_store(REVISION_CACHE_FILE)
+    try:
+        for config in PROCESSING_CONFIGS:
+            print(f"\n===== Запуск обработки для конфигурации: {config['category_name']} =====")
+            process_articles(
+                site=site, 
+                no_sources_redirects=all_redirects, # Передаем все собранные редиректы
+                category_name=config["category_name"],
+                main_template_name_for_summary=config["main_template_for_summary"],
+                bot_name=config["bot_name"],
+                replacement_date=config["replacement_date"],
+                rq_cutoff_date=config["rq_cutoff_date"],
+                rq_params_list=config["rq_params_list"]
+            )
+        
+        print("\n===== Все конфигурации обработаны =====")
+    finally:
+        if REVISION_STORE is not None:
+            print(f"Хранилище ревизий: прочитано с диска {REVISION_STORE.hits}, загружено из API {REVISION_STORE.misses}")
+            REVISION_STORE.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file